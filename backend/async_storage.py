@@ -0,0 +1,109 @@
+"""Async storage API, running the blocking storage functions on a bounded thread pool."""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+import storage
+from config import STORAGE_WORKERS
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get the storage thread pool, creating it on first use."""
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix="storage")
+
+    return _executor
+
+
+def shutdown() -> None:
+    """Wait for pending storage work and stop the thread pool."""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking storage function on the storage thread pool, timing it.
+
+    Args:
+        func: Storage function to call
+        *args: Positional arguments for the function
+        **kwargs: Keyword arguments for the function
+
+    Returns:
+        The function result
+    """
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+
+    try:
+        return await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+    finally:
+        metrics.STORAGE_SECONDS.observe(time.monotonic() - started, operation=func.__name__)
+
+
+async def create_conversation(conversation_id: str) -> Dict[str, Any]:
+    """Create a new conversation, see storage.create_conversation."""
+    return await run(storage.create_conversation, conversation_id)
+
+
+async def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """Load a conversation, see storage.get_conversation."""
+    return await run(storage.get_conversation, conversation_id)
+
+
+async def list_conversations(limit: Optional[int] = None, before: Optional[str] = None) -> List[Dict[str, Any]]:
+    """List conversations metadata, see storage.list_conversations."""
+    return await run(storage.list_conversations, limit=limit, before=before)
+
+
+async def add_user_message(conversation_id: str, content: str):
+    """Add a user message, see storage.add_user_message."""
+    await run(storage.add_user_message, conversation_id, content)
+
+
+async def add_assistant_message(
+    conversation_id: str,
+    stage1: List[Dict[str, Any]],
+    stage2: List[Dict[str, Any]],
+    stage3: Dict[str, Any]
+):
+    """Add an assistant message, see storage.add_assistant_message."""
+    await run(storage.add_assistant_message, conversation_id, stage1, stage2, stage3)
+
+
+async def update_assistant_message(
+    conversation_id: str,
+    index: int,
+    stage1: List[Dict[str, Any]],
+    stage2: List[Dict[str, Any]],
+    stage3: Dict[str, Any]
+):
+    """Replace the stages of an assistant message, see storage.update_assistant_message."""
+    await run(storage.update_assistant_message, conversation_id, index, stage1, stage2, stage3)
+
+
+async def update_conversation_title(conversation_id: str, title: str):
+    """Update a conversation title, see storage.update_conversation_title."""
+    await run(storage.update_conversation_title, conversation_id, title)
+
+
+async def update_conversation_summary(conversation_id: str, text: str, turns: int):
+    """Update the rolling summary of a conversation, see storage.update_conversation_summary."""
+    await run(storage.update_conversation_summary, conversation_id, text, turns)
+
+
+async def delete_conversation(conversation_id: str) -> bool:
+    """Delete a conversation, see storage.delete_conversation."""
+    return await run(storage.delete_conversation, conversation_id)
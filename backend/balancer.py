@@ -0,0 +1,72 @@
+"""Load balancing of one model over the pool of Ollama hosts serving it."""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Set
+
+
+class ReplicaPool():
+    """
+    Route the requests for one model over the hosts serving it.
+
+    With the 'least-outstanding' policy the host with the fewest requests in
+    flight goes first, with the 'latency' policy the host with the lowest
+    expected wait : its average latency times its requests in flight plus
+    one. Hosts ejected by the health checks are left out until readmitted.
+    """
+
+    def __init__(self, hosts: List[str], policy: str = "least-outstanding", smoothing: float = 0.3):
+
+        self.hosts = hosts
+        self.policy = policy
+        self.smoothing = smoothing
+
+        # Requests in flight and moving average latency, by host
+        self.outstanding : Dict[str, int] = {host: 0 for host in hosts}
+        self.latency : Dict[str, float] = {}
+
+        self.ejected : Set[str] = set()
+
+    def order(self) -> List[str]:
+        """Get the healthy hosts, best first, ties broken by configuration order."""
+        def cost(host: str) -> float:
+            if self.policy == "latency":
+                # Unknown hosts get the best known latency so that they get tried, all of them one second at first
+                known = min(self.latency.values(), default=1.0)
+                return self.latency.get(host, known) * (self.outstanding[host] + 1)
+            return self.outstanding[host]
+
+        return sorted((host for host in self.hosts if host not in self.ejected), key=cost)
+
+    @contextmanager
+    def track(self, host: str) -> Iterator[None]:
+        """Count a request in flight on a host, recording its latency if it succeeds."""
+        self.outstanding[host] += 1
+        started = time.monotonic()
+
+        try:
+            yield
+        finally:
+            self.outstanding[host] -= 1
+
+        elapsed = time.monotonic() - started
+        previous = self.latency.get(host, elapsed)
+        self.latency[host] = previous + self.smoothing * (elapsed - previous)
+
+    def set_healthy(self, host: str, healthy: bool) -> None:
+        """Eject a host from the pool, or readmit it."""
+        if healthy:
+            self.ejected.discard(host)
+        elif host in self.outstanding:
+            self.ejected.add(host)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        """Get the state of every host of the pool."""
+        return {
+            host: {
+                "outstanding": self.outstanding[host],
+                "latency": round(self.latency[host], 3) if host in self.latency else None,
+                "healthy": host not in self.ejected
+            }
+            for host in self.hosts
+        }
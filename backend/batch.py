@@ -0,0 +1,240 @@
+"""
+Batch evaluation : run the council over a JSONL file of questions, without the API.
+
+Each input line is a JSON object with a 'query' (or 'question') and an
+optional 'id', defaulting to its line number. Results are appended to the
+output JSONL as they finish ; run the same command again to resume an
+interrupted batch, questions already answered are skipped.
+
+Usage :
+    python batch.py questions.jsonl results.jsonl --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Set
+
+import logs
+import ollama
+from bootstrap import ModelBootstrap
+from config import COUNCIL_MODELS, COUNCIL_MAX_RUNS, PIPELINE_STAGE2
+from council import Council
+
+logger = logs.get_logger("batch")
+
+
+def read_questions(path: str) -> List[Dict[str, Any]]:
+    """
+    Read the questions of a batch.
+
+    Args:
+        path: Path of the input JSONL file
+
+    Returns:
+        List of questions with 'id' and 'query'
+    """
+    questions = []
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"query": record}
+
+            questions.append({
+                **record,
+                "id": str(record.get("id", number)),
+                "query": record.get("query") or record.get("question")
+            })
+
+    return questions
+
+
+def read_checkpoint(path: str) -> Set[str]:
+    """
+    Get the questions already answered by a previous run.
+
+    Failed questions are not part of the checkpoint, they are run again. A
+    line cut short by an interruption is ignored.
+
+    Args:
+        path: Path of the output JSONL file
+
+    Returns:
+        Ids of the answered questions
+    """
+    done = set()
+
+    if not os.path.exists(path):
+        return done
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+            if not record.get("error"):
+                done.add(record["id"])
+
+    return done
+
+
+class BatchRunner():
+    """Run council queries from a queue with `concurrency` workers, appending results to a JSONL file."""
+
+    def __init__(self, council: Council, output: str, concurrency: int = COUNCIL_MAX_RUNS, pipelined: bool = PIPELINE_STAGE2, use_cache: bool = True):
+
+        self.council = council
+        self.output = output
+        self.concurrency = concurrency
+        self.pipelined = pipelined
+        self.use_cache = use_cache
+
+        self.total : int = 0
+        self.completed : int = 0
+        self.failed : int = 0
+        self.started : float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Answered questions per minute since the start."""
+        elapsed = time.monotonic() - self.started
+        return 60 * self.completed / elapsed if elapsed > 0 else 0.0
+
+    async def run(self, questions: List[Dict[str, Any]]) -> None:
+        """
+        Answer every question, `concurrency` at a time.
+
+        Args:
+            questions: Questions with 'id' and 'query'
+        """
+        queue : asyncio.Queue = asyncio.Queue()
+        for question in questions:
+            queue.put_nowait(question)
+
+        self.total = len(questions)
+        self.started = time.monotonic()
+
+        with open(self.output, 'a', encoding='utf-8') as out:
+            workers = [asyncio.create_task(self.worker(queue, out)) for _ in range(self.concurrency)]
+
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+    async def worker(self, queue: asyncio.Queue, out) -> None:
+        """Answer questions from the queue until it is empty."""
+        while not queue.empty():
+            question = queue.get_nowait()
+            record = await self.answer(question)
+
+            # One line per question, flushed so that an interruption loses only the running questions
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+
+            self.completed += 1
+            if record.get("error"):
+                self.failed += 1
+
+            logger.info("Question answered", extra={
+                "completed": self.completed,
+                "total": self.total,
+                "id": question["id"],
+                "failed": bool(record.get("error")),
+                "elapsed": record["elapsed"],
+                "queries_per_min": round(self.throughput, 2)
+            })
+
+    async def answer(self, question: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the council on one question."""
+        started = time.monotonic()
+
+        try:
+            stage1, stage2, stage3, metadata = await self.council.run_full_council(
+                question["query"],
+                pipelined=self.pipelined,
+                use_cache=self.use_cache
+            )
+            record = {
+                "stage1": stage1,
+                "stage2": stage2,
+                "stage3": stage3,
+                "metadata": metadata,
+                "error": bool(stage3.get("error"))
+            }
+
+        except Exception as e:
+            record = {"error": True, "detail": str(e)}
+
+        return {
+            "id": question["id"],
+            "query": question["query"],
+            **record,
+            "elapsed": round(time.monotonic() - started, 3)
+        }
+
+
+async def main(args: argparse.Namespace) -> None:
+    """Provision the models, then answer the questions not answered yet."""
+    questions = read_questions(args.input)
+    done = read_checkpoint(args.output)
+    todo = [question for question in questions if question["id"] not in done]
+
+    logger.info("Questions read", extra={"questions": len(questions), "answered": len(done), "todo": len(todo)})
+    if not todo:
+        return
+
+    ollama.open_clients(COUNCIL_MODELS)
+    ollama.configure_hosts(COUNCIL_MODELS)
+
+    bootstrap = ModelBootstrap(COUNCIL_MODELS, warmup=True)
+
+    try:
+        if not args.skip_bootstrap:
+            await bootstrap.run()
+            if not bootstrap.ready:
+                raise SystemExit(f"Models not ready : {bootstrap.stats()['models']}")
+
+        runner = BatchRunner(Council(), args.output, args.concurrency, args.pipelined, not args.no_cache)
+        await runner.run(todo)
+
+        logger.info("Batch finished", extra={
+            "completed": runner.completed,
+            "failed": runner.failed,
+            "seconds": round(time.monotonic() - runner.started, 3),
+            "queries_per_min": round(runner.throughput, 2)
+        })
+
+    finally:
+        await ollama.close_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the LLM council over a JSONL file of questions.")
+    parser.add_argument("input", help="JSONL file of questions, with 'query' and optional 'id'")
+    parser.add_argument("output", help="JSONL file of results, appended to and used to resume")
+    parser.add_argument("--concurrency", type=int, default=COUNCIL_MAX_RUNS, help="Council runs at once")
+    parser.add_argument("--pipelined", action="store_true", default=PIPELINE_STAGE2, help="Start stage 2 once a quorum answered")
+    parser.add_argument("--no-cache", action="store_true", help="Run every question even if a cached run exists")
+    parser.add_argument("--skip-bootstrap", action="store_true", help="Do not pull and preload the models first")
+
+    logs.setup_logging(fmt="text")
+
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        logger.warning("Interrupted, run the same command again to resume")
+    finally:
+        logs.shutdown_logging()
@@ -0,0 +1,153 @@
+"""Stand-in Ollama server for the benchmarks, with configurable latency, token rate and failures."""
+
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class ModelProfile():
+    """
+    Behaviour of one fake model.
+
+    The time to first token follows a log-normal distribution of median
+    `latency` and shape `jitter`, then `tokens` tokens are generated at
+    `token_rate` tokens per second. A share `error_rate` of the requests
+    fail with an HTTP 500.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.3, tokens: int = 60, token_rate: float = 300.0, error_rate: float = 0.0):
+
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens = tokens
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+
+    def first_token(self) -> float:
+        """Sample a time to first token, in seconds."""
+        return self.latency * math.exp(random.gauss(0, self.jitter)) if self.jitter > 0 else self.latency
+
+
+# Stage 2 needs a parsable ranking to aggregate, every answer ends with one
+ANSWER = "Réponse de {model} : point un, point deux, point trois. "
+RANKING = "FINAL RANKING:\n1. Response A\n2. Response B\n3. Response C"
+
+
+def create_app(profiles: Dict[str, ModelProfile], default: Optional[ModelProfile] = None) -> FastAPI:
+    """
+    Create the fake Ollama API.
+
+    Args:
+        profiles: Profile by model name
+        default: Profile of the models not listed
+
+    Returns:
+        FastAPI app answering /api/chat, /api/tags, /api/pull, /api/create and /api/ps
+    """
+    app = FastAPI()
+    default = default or ModelProfile()
+
+    def profile_of(model: str) -> ModelProfile:
+        return profiles.get(model, default)
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": name} for name in profiles]}
+
+    @app.post("/api/pull")
+    async def pull():
+        return {"status": "success"}
+
+    @app.post("/api/create")
+    async def create():
+        return {"status": "success"}
+
+    @app.get("/api/ps")
+    async def ps():
+        return {"models": []}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        payload = await request.json()
+        model = payload["model"]
+        profile = profile_of(model)
+
+        # Empty chats only load the model
+        if not payload.get("messages"):
+            return {"model": model, "done": True, "message": {"role": "assistant", "content": ""}}
+
+        if random.random() < profile.error_rate:
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+
+        words = (ANSWER.format(model=model) * (profile.tokens // 10 + 1)).split(" ")[:profile.tokens]
+        words.append(RANKING)
+
+        started = time.monotonic()
+        first_token = profile.first_token()
+
+        def stats() -> Dict[str, Any]:
+            elapsed = time.monotonic() - started
+            return {
+                "done": True,
+                "eval_count": len(words),
+                "eval_duration": int((elapsed - first_token) * 1e9),
+                "prompt_eval_count": sum(len(m.get("content", "")) // 4 for m in payload["messages"]),
+                "prompt_eval_duration": int(first_token * 1e9),
+                "load_duration": 0,
+                "total_duration": int(elapsed * 1e9)
+            }
+
+        if payload.get("stream", True):
+            async def generate():
+                await asyncio.sleep(first_token)
+                for word in words:
+                    yield json.dumps({"model": model, "message": {"role": "assistant", "content": word + " "}, "done": False}) + "\n"
+                    await asyncio.sleep(1 / profile.token_rate)
+                yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, **stats()}) + "\n"
+
+            return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+        await asyncio.sleep(first_token + len(words) / profile.token_rate)
+        return {"model": model, "message": {"role": "assistant", "content": " ".join(words)}, **stats()}
+
+    return app
+
+
+class ServerThread():
+    """Serve an ASGI app with uvicorn on a background thread, with its own event loop."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 11500):
+
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def start(self, timeout: float = 10.0) -> "ServerThread":
+        """Start the server and wait until it accepts connections."""
+        self.thread.start()
+
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError(f"Server on {self.address} did not start")
+            time.sleep(0.05)
+
+        return self
+
+    def stop(self) -> None:
+        """Stop the server and wait for its thread."""
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
@@ -0,0 +1,341 @@
+"""
+Benchmarks of the council against a fake Ollama server.
+
+Scenarios :
+- council : concurrent users running the full council directly
+- slow : one slow councillor, with and without pipelined stage 2
+- failures : councillors failing a share of their requests
+- sse : concurrent users streaming through the FastAPI app over HTTP
+- storage : reads and appends on a large conversation
+
+Usage, from the backend folder :
+    python -m bench.run --output bench/baseline.json
+    python -m bench.run --baseline bench/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+import uvicorn
+
+import logs
+import ollama
+import storage
+from config import COUNCIL_MODELS
+from council import Council
+from models import Role
+from bench.fake_ollama import ModelProfile, ServerThread, create_app
+
+FAKE_PORT = 11500
+APP_PORT = 11501
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    Get the distribution of latency samples.
+
+    Args:
+        samples: Latencies in seconds
+
+    Returns:
+        Count, mean, p50, p95, p99 and max, in seconds
+    """
+    if not samples:
+        return {"count": 0}
+
+    ordered = sorted(samples)
+
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 4),
+        "p50": round(percentile(50), 4),
+        "p95": round(percentile(95), 4),
+        "p99": round(percentile(99), 4),
+        "max": round(ordered[-1], 4)
+    }
+
+
+def use_profiles(profiles: Dict[str, ModelProfile], councillors: Optional[ModelProfile] = None, slow: Optional[ModelProfile] = None) -> None:
+    """Set the profile of every council model, the last councillor getting the slow profile if given."""
+    profiles.clear()
+
+    names = [model.model_name for model in COUNCIL_MODELS if model.model_role == Role.COUNCILOR]
+
+    for model in COUNCIL_MODELS:
+        profiles[model.model_name] = (councillors or ModelProfile()) if model.model_role == Role.COUNCILOR else ModelProfile()
+
+    if slow is not None:
+        profiles[names[-1]] = slow
+
+    # A scenario must not start with the circuits opened by the previous one
+    ollama._breakers.clear()
+
+
+async def run_users(users: int, rounds: int, run_one: Callable[[int, int], Any]) -> Dict[str, Any]:
+    """
+    Run `rounds` sequential runs for each of `users` concurrent users.
+
+    Args:
+        users: Concurrent users
+        rounds: Runs per user
+        run_one: Coroutine function (user, round) returning the run latencies by name, None if it failed
+
+    Returns:
+        Distribution of every latency, throughput in runs per minute and failed runs
+    """
+    samples : Dict[str, List[float]] = {}
+    failed = 0
+
+    async def user(number: int):
+        nonlocal failed
+        for round_number in range(rounds):
+            latencies = await run_one(number, round_number)
+            if latencies is None:
+                failed += 1
+                continue
+            for name, value in latencies.items():
+                samples.setdefault(name, []).append(value)
+
+    started = time.monotonic()
+    await asyncio.gather(*(user(number) for number in range(users)))
+    elapsed = time.monotonic() - started
+
+    return {
+        **{name: summarize(values) for name, values in samples.items()},
+        "throughput_per_min": round(60 * (users * rounds - failed) / elapsed, 2),
+        "failed": failed,
+        "wall_time": round(elapsed, 3)
+    }
+
+
+async def council_runs(users: int, rounds: int, pipelined: bool = False) -> Dict[str, Any]:
+    """Run the full council directly, without cache."""
+    council = Council()
+
+    async def run_one(user: int, round_number: int):
+        started = time.monotonic()
+        stage1, _, stage3, _ = await council.run_full_council(f"Question {user}-{round_number}", pipelined=pipelined, use_cache=False)
+        if stage3.get("error") or len(stage1) < len(council.models):
+            return None
+        return {"latency": time.monotonic() - started}
+
+    return await run_users(users, rounds, run_one)
+
+
+@asynccontextmanager
+async def serve_api(port: int) -> AsyncIterator[None]:
+    """
+    Serve the FastAPI app on the running event loop while the context is open.
+
+    The app shares the pooled ollama clients and dispatchers of the loop, so
+    it cannot run on a thread of its own.
+    """
+    import main as api
+
+    api.council = Council()
+
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    try:
+        yield
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def sse_runs(users: int, rounds: int) -> Dict[str, Any]:
+    """Stream council runs through the API, measuring the first event, the first token and the completion."""
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=300) as client:
+
+        # The API is live right away, wait for the bootstrap
+        while (await client.get("/ready")).status_code != 200:
+            await asyncio.sleep(0.1)
+
+        async def run_one(user: int, round_number: int):
+            conversation = (await client.post("/api/conversations", json={})).json()
+            latencies = {}
+            started = time.monotonic()
+
+            async with client.stream(
+                "POST",
+                f"/api/conversations/{conversation['id']}/message/stream",
+                json={"content": f"Question {user}-{round_number}", "use_cache": False}
+            ) as response:
+                if response.status_code != 200:
+                    return None
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+
+                    event = json.loads(line[6:])
+                    elapsed = time.monotonic() - started
+
+                    latencies.setdefault("first_event", elapsed)
+                    if event["type"] == "stage1_delta":
+                        latencies.setdefault("first_token", elapsed)
+                    elif event["type"] == "error":
+                        return None
+                    elif event["type"] == "complete":
+                        latencies["latency"] = elapsed
+
+            return latencies if "latency" in latencies else None
+
+        return await run_users(users, rounds, run_one)
+
+
+async def storage_runs(messages: int, reads: int) -> Dict[str, Any]:
+    """Append to and read a large conversation."""
+    conversation_id = str(uuid.uuid4())
+    storage.create_conversation(conversation_id)
+
+    answer = "Lorem ipsum dolor sit amet. " * 80
+    stage1 = [{"model": model.model_name, "response": answer} for model in COUNCIL_MODELS[1:]]
+    stage2 = [{"model": model.model_name, "ranking": answer, "parsed_ranking": ["Response A"]} for model in COUNCIL_MODELS[1:]]
+    stage3 = {"model": COUNCIL_MODELS[0].model_name, "response": answer}
+
+    appends, gets, lists = [], [], []
+
+    for _ in range(messages // 2):
+        started = time.monotonic()
+        storage.add_user_message(conversation_id, "Question " + answer[:200])
+        storage.add_assistant_message(conversation_id, stage1, stage2, stage3)
+        appends.append(time.monotonic() - started)
+
+    for _ in range(reads):
+        started = time.monotonic()
+        storage.get_conversation(conversation_id)
+        gets.append(time.monotonic() - started)
+
+        started = time.monotonic()
+        storage.list_conversations(limit=50)
+        lists.append(time.monotonic() - started)
+
+    return {
+        "append_turn": summarize(appends),
+        "get_conversation": summarize(gets),
+        "list_conversations": summarize(lists),
+        "messages": messages
+    }
+
+
+async def run_scenarios(names: List[str], users: int, rounds: int, profiles: Dict[str, ModelProfile]) -> Dict[str, Any]:
+    """Run the given scenarios in order."""
+    results = {}
+
+    for name in names:
+        if name == "council":
+            use_profiles(profiles)
+            results[name] = await council_runs(users, rounds)
+
+        elif name == "slow":
+            use_profiles(profiles, slow=ModelProfile(latency=2.0, jitter=0.2))
+            results[name] = {
+                "full": await council_runs(users, rounds),
+                "pipelined": await council_runs(users, rounds, pipelined=True)
+            }
+
+        elif name == "failures":
+            use_profiles(profiles, councillors=ModelProfile(error_rate=0.2))
+            results[name] = await council_runs(users, rounds)
+
+        elif name == "sse":
+            use_profiles(profiles)
+            async with serve_api(APP_PORT):
+                results[name] = await sse_runs(users, rounds)
+
+        elif name == "storage":
+            results[name] = await storage_runs(messages=400, reads=20)
+
+    return results
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], prefix: str = "") -> List[str]:
+    """List the changes of every latency and throughput between two results."""
+    lines = []
+
+    for key, value in current.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f"{prefix}.{key}" if prefix else key
+
+        if isinstance(value, dict):
+            lines += compare(old or {}, value, name)
+        elif key in ("p50", "p95", "p99", "throughput_per_min") and isinstance(old, (int, float)) and old:
+            lines.append(f"{name:<45} {old:>10.4f} -> {value:>10.4f} ({100 * (value - old) / old:+.1f}%)")
+
+    return lines
+
+
+def main(args: argparse.Namespace) -> None:
+    """Start the fake ollama server, run the scenarios and report."""
+    profiles : Dict[str, ModelProfile] = {}
+    fake = ServerThread(create_app(profiles), port=FAKE_PORT).start()
+
+    # Every model is served by the fake server
+    for model in COUNCIL_MODELS:
+        model.ip, model.port, model.replicas = fake.host, fake.port, []
+
+    ollama.open_clients(COUNCIL_MODELS)
+    ollama.configure_hosts(COUNCIL_MODELS)
+
+    storage.DATA_DIR = tempfile.mkdtemp(prefix="council-bench-")
+
+    # Keep the report readable, only warnings unless verbose
+    logs.setup_logging(level="DEBUG" if args.verbose else "WARNING", fmt="text")
+
+    try:
+        results = asyncio.run(run_scenarios(args.scenarios.split(","), args.users, args.rounds, profiles))
+    finally:
+        fake.stop()
+        logs.shutdown_logging()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "users": args.users,
+            "rounds": args.rounds
+        },
+        "scenarios": results
+    }
+
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+        print(f"\nCompared to {args.baseline} ({baseline['meta']['timestamp']}) :")
+        print("\n".join(compare(baseline["scenarios"], results)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the LLM council against a fake Ollama server.")
+    parser.add_argument("--scenarios", default="council,slow,failures,sse,storage", help="Comma separated scenarios to run")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent users")
+    parser.add_argument("--rounds", type=int, default=3, help="Runs per user")
+    parser.add_argument("--output", help="Save the results as a JSON baseline")
+    parser.add_argument("--baseline", help="JSON baseline to compare the results with")
+    parser.add_argument("--verbose", action="store_true", help="Log the council requests and payloads")
+
+    main(parser.parse_args())
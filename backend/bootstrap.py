@@ -0,0 +1,211 @@
+"""Background bootstrap of the council models : provisioning, warm-up, keep-warm passes and health checks."""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from models import CouncilModel, ModelType, Role
+from ollama import check_model_health, create_model, preload_model, pull_model, set_host_health
+
+
+class ModelBootstrap():
+    """
+    Provision and preload every council model in the background, tracking readiness.
+
+    Each model is pulled, created from its prompt if custom, health checked,
+    then loaded in memory, on every host of its pool. Hosts are provisioned
+    in parallel and the API is live right away ; it is ready once the
+    chairman and at least one councillor are loaded on a healthy host.
+
+    A model that failed a step (e.g. ollama not up yet) is provisioned
+    again after `retry_delay` seconds, doubled on each failure up to
+    `max_retry_delay`, it stays routable meanwhile. Every
+    `health_interval` seconds the hosts are checked again, failing hosts
+    are ejected from the pool of the model until they recover ; a failed
+    model found healthy is readmitted and provisioned again right away.
+    """
+
+    def __init__(
+        self,
+        models: List[CouncilModel],
+        warmup: bool = True,
+        interval: float = 0.0,
+        health_interval: float = 0.0,
+        retry_delay: float = 0.0,
+        max_retry_delay: float = 300.0
+    ):
+
+        self.models = models
+        self.warmup = warmup
+        self.interval = interval
+        self.health_interval = health_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        # Every model on every host serving it
+        self.targets : List[Tuple[CouncilModel, str]] = [(model, host) for model in models for host in model.hosts]
+
+        # State by model and host : status ('provisioning', 'ready' or 'failed'), current step, pull progress and health
+        self.status : Dict[str, Dict[str, Any]] = {
+            self.key(model, host): {"status": "provisioning", "step": "pending", "healthy": True}
+            for model, host in self.targets
+        }
+
+        # Set to cut short the wait before the next provisioning attempt, by model and host
+        self.wakeups : Dict[str, asyncio.Event] = {self.key(model, host): asyncio.Event() for model, host in self.targets}
+
+        # Pulls shared by the models built from the same base model on a host
+        self.pulls : Dict[Tuple[str, str], asyncio.Task] = {}
+
+        self.task : Optional[asyncio.Task] = None
+
+    def key(self, model: CouncilModel, host: Optional[str] = None) -> str:
+        """Identify a model on a host, its main host by default."""
+        return f"{model.model_name}@{host or model.host}"
+
+    def start(self) -> None:
+        """Start the bootstrap in the background."""
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop the bootstrap and keep-warm passes."""
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self) -> None:
+        """Provision every model, retrying the failed ones if set, while keeping them warm and checking their hosts."""
+        await asyncio.gather(
+            *(self.provision_until_ready(model, host) for model, host in self.targets),
+            self.keep_warm(),
+            self.monitor()
+        )
+
+    async def provision_until_ready(self, model: CouncilModel, host: str) -> None:
+        """Provision a model on a host, again with exponential backoff while it fails, if `retry_delay` is set."""
+        state = self.status[self.key(model, host)]
+        delay = self.retry_delay
+
+        await self.provision(model, host)
+
+        while state["status"] == "failed" and delay > 0:
+            state["retry_in"] = delay
+
+            wakeup = self.wakeups[self.key(model, host)]
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+            delay = min(delay * 2, self.max_retry_delay)
+
+            state["attempts"] = state.get("attempts", 1) + 1
+            await self.provision(model, host)
+
+        state.pop("retry_in", None)
+
+    async def keep_warm(self) -> None:
+        """Preload the ready models every `interval` seconds, if set."""
+        while self.warmup and self.interval > 0:
+            await asyncio.sleep(self.interval)
+            await asyncio.gather(*(
+                preload_model(model, host=host) for model, host in self.targets
+                if self.status[self.key(model, host)]["status"] == "ready"
+            ))
+
+    async def monitor(self) -> None:
+        """
+        Check every provisioned or failed host every `health_interval` seconds, if set.
+
+        Failing hosts are ejected, recovered ones readmitted ; a failed
+        model found healthy is provisioned again without waiting its backoff.
+        """
+        while self.health_interval > 0:
+            await asyncio.sleep(self.health_interval)
+
+            targets = [
+                (model, host) for model, host in self.targets
+                if self.status[self.key(model, host)]["status"] in ("ready", "failed")
+            ]
+            results = await asyncio.gather(*(check_model_health(model, host) for model, host in targets))
+
+            for (model, host), healthy in zip(targets, results):
+                self.set_healthy(model, host, healthy)
+
+                if healthy and self.status[self.key(model, host)]["status"] == "failed":
+                    self.wakeups[self.key(model, host)].set()
+
+    def set_healthy(self, model: CouncilModel, host: str, healthy: bool) -> None:
+        """Record the health of a model on a host, ejecting it from the pool when failing."""
+        self.status[self.key(model, host)]["healthy"] = healthy
+        set_host_health(model, host, healthy)
+
+    async def provision(self, model: CouncilModel, host: str) -> None:
+        """Pull, create, check and preload one model on one host, recording each step."""
+        state = self.status[self.key(model, host)]
+        state["status"] = "provisioning"
+
+        def on_progress(chunk: Dict[str, Any]) -> None:
+            state.update({
+                "step": "pull",
+                "detail": chunk.get("status"),
+                "completed": chunk.get("completed", state.get("completed")),
+                "total": chunk.get("total", state.get("total"))
+            })
+
+        steps = [
+            ("pull", lambda: self.pull(model, host, on_progress)),
+            ("create", lambda: create_model(model, host=host) if model.model_type == ModelType.CUSTOM else self.done()),
+            ("health", lambda: check_model_health(model, host)),
+            ("warmup", lambda: preload_model(model, host=host) if self.warmup else self.done())
+        ]
+
+        for step, run_step in steps:
+            state["step"] = step
+
+            # The host stays routable, its requests fail over or the circuit breaker opens on its own
+            if not await run_step():
+                state["status"] = "failed"
+                return
+
+        state.update({"status": "ready", "step": "done"})
+        self.set_healthy(model, host, True)
+
+    async def pull(self, model: CouncilModel, host: str, on_progress) -> bool:
+        """Pull the base model of a model, once per host."""
+        key = (host, model.base_model)
+
+        if key not in self.pulls:
+            self.pulls[key] = asyncio.create_task(pull_model(model, on_progress, host=host))
+
+        task = self.pulls[key]
+        pulled = await task
+
+        # A failed pull is attempted again on the next provisioning
+        if not pulled and self.pulls.get(key) is task:
+            del self.pulls[key]
+
+        return pulled
+
+    async def done(self) -> bool:
+        """Skipped step."""
+        return True
+
+    @property
+    def ready(self) -> bool:
+        """Check whether the chairman and at least one councillor are ready on a healthy host."""
+        def ready_models(role: Role) -> List[bool]:
+            return [
+                self.status[self.key(model, host)]["status"] == "ready" and self.status[self.key(model, host)]["healthy"]
+                for model, host in self.targets if model.model_role == role
+            ]
+
+        return any(ready_models(Role.CHAIRMAN)) and any(ready_models(Role.COUNCILOR))
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the readiness and the bootstrap state of every model."""
+        return {
+            "ready": self.ready,
+            "models": {key: dict(state) for key, state in self.status.items()}
+        }
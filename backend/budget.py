@@ -0,0 +1,137 @@
+"""Prompt budget : estimate prompt sizes and cut the council answers to fit the context window of the models."""
+
+import math
+from typing import Any, Dict, List, Tuple
+
+from config import PROMPT_CONTEXT_TOKENS, PROMPT_RESERVE_TOKENS, PROMPT_CHARS_PER_TOKEN
+
+# Appended to the texts that were cut
+TRUNCATION_MARK = "\n[...]"
+
+# Tokens of the labels wrapping each text in a prompt ('Response A:', 'Model: ...')
+ITEM_OVERHEAD_TOKENS = 16
+
+# Tokens kept for each text, even when the budget is exhausted
+MIN_ITEM_TOKENS = 32
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the tokens of a text from its length, no tokenizer of the models is available."""
+    return math.ceil(len(text) / PROMPT_CHARS_PER_TOKEN)
+
+
+def available_tokens(template: str, items: int) -> int:
+    """
+    Get the tokens left for the texts of a prompt.
+
+    Args:
+        template: Prompt with every text left empty
+        items: Number of texts pasted in the prompt
+
+    Returns:
+        Context window less the answer reserve, the template and the labels of the texts
+    """
+    return PROMPT_CONTEXT_TOKENS - PROMPT_RESERVE_TOKENS - estimate_tokens(template) - ITEM_OVERHEAD_TOKENS * items
+
+
+def needed_tokens(texts: List[str], cap: int) -> int:
+    """Get the tokens of texts each capped to `cap` tokens."""
+    return sum(min(estimate_tokens(text), cap) for text in texts)
+
+
+def truncate(text: str, max_tokens: int) -> Tuple[str, bool]:
+    """
+    Cut a text to about `max_tokens` tokens, on a line or sentence break when possible.
+
+    Args:
+        text: Text to cut
+        max_tokens: Tokens to keep
+
+    Returns:
+        Tuple of (text, whether it was cut)
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text, False
+
+    limit = int(max_tokens * PROMPT_CHARS_PER_TOKEN)
+    cut = text[:limit]
+
+    # Keep whole bullet points or sentences, unless that loses more than half of the text
+    for separator in ("\n", ". ", " "):
+        index = cut.rfind(separator)
+        if index > limit // 2:
+            cut = cut[:index + len(separator)]
+            break
+
+    return cut.rstrip() + TRUNCATION_MARK, True
+
+
+def fit(texts: List[str], available: int, cap: int) -> Tuple[List[str], List[int]]:
+    """
+    Cut texts to share a token budget.
+
+    Each text gets at most `cap` tokens. Texts shorter than an even share
+    leave what they do not use to the longer ones, so only the longest
+    texts are cut.
+
+    Args:
+        texts: Texts pasted in the same prompt
+        available: Tokens for all the texts
+        cap: Tokens for one text
+
+    Returns:
+        Tuple of (fitted texts, indices of the texts that were cut)
+    """
+    sizes = [min(estimate_tokens(text), cap) for text in texts]
+    limits = [0] * len(texts)
+    remaining = max(available, 0)
+
+    # Shortest first, each takes its size or an even share of what is left
+    for position, index in enumerate(sorted(range(len(texts)), key=lambda i: sizes[i])):
+        limits[index] = max(min(sizes[index], remaining // (len(texts) - position)), MIN_ITEM_TOKENS)
+        remaining -= limits[index]
+
+    fitted, cut = [], []
+    for index, (text, limit) in enumerate(zip(texts, limits)):
+        text, truncated = truncate(text, limit)
+        fitted.append(text)
+        if truncated:
+            cut.append(index)
+
+    return fitted, cut
+
+
+def condense_critique(stage2_result: Dict[str, Any]) -> str:
+    """Reduce a stage 2 critique to its parsed ranking."""
+    parsed = stage2_result.get("parsed_ranking") or []
+
+    if not parsed:
+        return "FINAL RANKING: aucun classement exploitable."
+
+    return "FINAL RANKING:\n" + "\n".join(f"{position}. {label}" for position, label in enumerate(parsed, start=1))
+
+
+def prompt_size(prompt: str, available: int, truncated: int, condensed: bool = False) -> Dict[str, Any]:
+    """
+    Describe a built prompt, as reported in the run metrics.
+
+    Args:
+        prompt: Prompt sent to the models
+        available: Tokens the texts of the prompt could use
+        truncated: Number of texts that were cut
+        condensed: Whether the critiques were reduced to their rankings
+
+    Returns:
+        Dictionary with the prompt size in characters and estimated tokens, and what was cut
+    """
+    tokens = estimate_tokens(prompt)
+
+    return {
+        "chars": len(prompt),
+        "estimated_tokens": tokens,
+        "context_tokens": PROMPT_CONTEXT_TOKENS,
+        "over_budget": tokens + PROMPT_RESERVE_TOKENS > PROMPT_CONTEXT_TOKENS,
+        "available_tokens": available,
+        "truncated": truncated,
+        "condensed": condensed
+    }
@@ -0,0 +1,193 @@
+"""Content-addressed cache of council runs, in memory with an optional on-disk tier."""
+
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so that trivially different spellings share a cache entry."""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def make_key(query: str, models: Iterable[str], prompts: Iterable[str], **options: Any) -> str:
+    """
+    Build the cache key of a council run.
+
+    Args:
+        query: User query, normalized before hashing
+        models: Names of the models involved, in council order
+        prompts: Prompt templates used by the stages
+        **options: Any other setting changing the result
+
+    Returns:
+        Hex digest identifying the run
+    """
+    material = json.dumps({
+        "query": normalize_query(query),
+        "models": list(models),
+        "prompts": list(prompts),
+        "options": options
+    }, sort_keys=True, ensure_ascii=False)
+
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache():
+    """
+    Size-bounded LRU cache with a TTL, backed by an optional directory.
+
+    Entries are JSON values; memory hits return copies so callers can
+    mutate the result freely. The directory holds at most
+    `max_disk_entries` entries, the least recently written or read from
+    disk are deleted beyond, as are the expired ones.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 86400.0, directory: Optional[str] = None, max_disk_entries: int = 4096):
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+
+        self.entries : "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.directory:
+            Path(self.directory).mkdir(parents=True, exist_ok=True)
+
+    def get_path(self, key: str) -> str:
+        """Get the file path of an on-disk entry."""
+        return os.path.join(self.directory, f"{key}.json")
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Look up an entry, from memory first then from disk.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Copy of the cached value, None on miss or expiry
+        """
+        entry = self.entries.get(key)
+
+        if entry is None and self.directory:
+            entry = await asyncio.to_thread(self.read_entry, key)
+            if entry is not None:
+                self.store(key, entry)
+
+        if entry is None or time.time() - entry[0] > self.ttl:
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        return copy.deepcopy(entry[1])
+
+    async def put(self, key: str, value: Any) -> None:
+        """
+        Store an entry in memory, and on disk if enabled.
+
+        Args:
+            key: Cache key
+            value: JSON serializable value
+        """
+        entry = (time.time(), copy.deepcopy(value))
+        self.store(key, entry)
+
+        if self.directory:
+            await asyncio.to_thread(self.write_entry, key, entry)
+
+    def store(self, key: str, entry: Tuple[float, Any]) -> None:
+        """Insert an entry in memory, evicting the least recently used ones."""
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def read_entry(self, key: str) -> Optional[Tuple[float, Any]]:
+        """Read an entry from disk, None if absent, unreadable or expired (the file is then deleted)."""
+        path = self.get_path(key)
+
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            entry = data["created_at"], data["value"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+        try:
+            if time.time() - entry[0] > self.ttl:
+                os.remove(path)
+                return None
+
+            # Recently read entries are the last evicted
+            os.utime(path)
+        except OSError:
+            pass
+
+        return entry
+
+    def write_entry(self, key: str, entry: Tuple[float, Any]) -> None:
+        """Write an entry to disk, replacing the file atomically."""
+        path = self.get_path(key)
+        # Per process, the API workers may write the same entry at once
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+
+        with open(tmp_path, 'w') as f:
+            json.dump({"created_at": entry[0], "value": entry[1]}, f)
+
+        os.replace(tmp_path, path)
+
+        self.prune_disk()
+
+    def prune_disk(self) -> None:
+        """Delete the expired entries from disk, then the least recently used ones beyond `max_disk_entries`."""
+        now = time.time()
+        files = []
+
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    try:
+                        files.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        pass
+
+        # Oldest first, an entry is never older than its file
+        files.sort()
+        excess = len(files) - self.max_disk_entries
+
+        for index, (modified, path) in enumerate(files):
+            if index < excess or now - modified > self.ttl:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the cache counters."""
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "disk": bool(self.directory)
+        }
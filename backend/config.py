@@ -20,10 +20,93 @@ load_dotenv()
 # > Adjust the port if necessary
 # ============================================================================
 
+# Logging, written to stdout by a background thread
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO") # DEBUG also logs prompts and answers, sampled
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json") # 'json' : one object per line, 'text' : readable lines
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", "2000")) # Characters of a prompt or answer kept in a log record
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.05")) # Share of the prompts and answers logged at DEBUG level
+
 # Constants, can be defined by an .env file
 CHAIRMAN_IP = os.getenv("CHAIRMAN_IP", "ollama")  # Host IP, local container with ollama for chairman
 OLLAMA_PORT = int(os.getenv("OLLAMA_PORT", "11434")) # Default ollama port
 
+# Connection pool settings, one pooled client is kept per ollama host
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "8")) # Max open connections per host
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "8")) # Max idle connections kept per host
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60")) # Seconds before idle connections are closed
+
+# Model residency, how long ollama keeps weights loaded after a request, and warm-up after provisioning
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m") # Ollama duration, '-1' keeps the models loaded forever
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true" # Preload every model once provisioned
+WARMUP_INTERVAL = float(os.getenv("WARMUP_INTERVAL", "0")) # Seconds between keep-warm passes, 0 to disable
+PROVISION_RETRY_DELAY = float(os.getenv("PROVISION_RETRY_DELAY", "5")) # Seconds before provisioning a failed model again, doubled on each failure
+PROVISION_RETRY_MAX_DELAY = float(os.getenv("PROVISION_RETRY_MAX_DELAY", "300")) # Longest wait between two provisioning attempts
+
+# Retries, circuit breakers and hedging of ollama requests
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "180")) # Seconds before one request to a model times out
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", "2")) # Retries of a failed request, on another replica when possible
+OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5")) # Base seconds of the jittered exponential backoff
+OLLAMA_RETRY_BACKOFF_MAX = float(os.getenv("OLLAMA_RETRY_BACKOFF_MAX", "8")) # Max seconds between two attempts
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3")) # Consecutive failures before skipping a host
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30")) # Seconds before trying a skipped host again
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true" # Duplicate slow requests to a replica
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95")) # Model latency percentile after which a request is duplicated
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "30")) # Seconds before duplicating, until enough latencies are known
+
+# Replica pools, extra ollama hosts ('ip:port', comma separated) serving the same models
+# > COUNCIL_REPLICAS : hosts serving every councillor, add a box to scale out the council
+# > MODEL_REPLICAS : hosts by model, as 'model=host,host;model=host', e.g. 'gemma3:1b=10.0.0.3:11434'
+COUNCIL_REPLICAS = [host.strip() for host in os.getenv("COUNCIL_REPLICAS", "").split(",") if host.strip()]
+MODEL_REPLICAS = {
+    name.strip(): [host.strip() for host in hosts.split(",") if host.strip()]
+    for name, _, hosts in (entry.partition("=") for entry in os.getenv("MODEL_REPLICAS", "").split(";") if "=" in entry)
+}
+LOAD_BALANCING = os.getenv("LOAD_BALANCING", "least-outstanding") # 'least-outstanding' or 'latency' routing over a pool
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "30")) # Seconds between health checks of the pools, 0 to disable
+
+# Deadlines of each council stage, in seconds, covering every attempt of every model
+STAGE1_TIMEOUT = float(os.getenv("STAGE1_TIMEOUT", "300"))
+STAGE2_TIMEOUT = float(os.getenv("STAGE2_TIMEOUT", "300"))
+STAGE3_TIMEOUT = float(os.getenv("STAGE3_TIMEOUT", "300"))
+
+# Prompt budget of stages 2 and 3, answers and critiques are cut to fit the context window of the models
+# > Match PROMPT_CONTEXT_TOKENS with the context length of the ollama instances (OLLAMA_CONTEXT_LENGTH)
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "4096")) # Context window of the models, in tokens
+PROMPT_RESERVE_TOKENS = int(os.getenv("PROMPT_RESERVE_TOKENS", "1024")) # Tokens left for the answer
+PROMPT_CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "3.5")) # Characters per token, to estimate prompt sizes
+STAGE2_ANSWER_TOKENS = int(os.getenv("STAGE2_ANSWER_TOKENS", "600")) # Tokens of each answer shown to the reviewers
+STAGE3_ANSWER_TOKENS = int(os.getenv("STAGE3_ANSWER_TOKENS", "500")) # Tokens of each answer shown to the chairman
+STAGE3_CRITIQUE_TOKENS = int(os.getenv("STAGE3_CRITIQUE_TOKENS", "300")) # Tokens of each critique shown to the chairman
+STAGE3_CRITIQUES = os.getenv("STAGE3_CRITIQUES", "auto") # 'full', 'rankings' : parsed rankings only, 'auto' : rankings when the prompt does not fit
+
+# Synthesis of stage 3, 'full' : answers and critiques, 'compact' : answers ordered by aggregate rank and the rank table
+SYNTHESIS_MODE = os.getenv("SYNTHESIS_MODE", "full")
+
+# Admission control, council runs beyond the limit wait in a FIFO queue, then get rejected
+COUNCIL_MAX_RUNS = int(os.getenv("COUNCIL_MAX_RUNS", "2")) # Council runs processed at once
+COUNCIL_MAX_QUEUE = int(os.getenv("COUNCIL_MAX_QUEUE", "16")) # Council runs waiting before rejecting with 429
+
+# Default host budget, match the OLLAMA_NUM_PARALLEL and OLLAMA_MAX_LOADED_MODELS of the ollama instances
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "1")) # Concurrent requests per loaded model
+OLLAMA_MAX_LOADED_MODELS = int(os.getenv("OLLAMA_MAX_LOADED_MODELS", "3")) # Models a host keeps in memory at once
+
+# Pipelined stage 2, start peer review before every councillor answered (opt-in)
+PIPELINE_STAGE2 = os.getenv("PIPELINE_STAGE2", "false").lower() == "true"
+STAGE1_QUORUM = int(os.getenv("STAGE1_QUORUM", "2")) # Answers needed to start stage 2
+STAGE1_DEADLINE = float(os.getenv("STAGE1_DEADLINE", "60")) # Seconds before starting stage 2 with at least one answer
+STAGE1_STRAGGLERS = os.getenv("STAGE1_STRAGGLERS", "late") # 'late' : add late answers for stage 3, 'drop' : cancel them
+
+# Streamed runs, kept for the clients reconnecting with Last-Event-ID
+RUN_BUFFER_EVENTS = int(os.getenv("RUN_BUFFER_EVENTS", "5000")) # Events kept per run, token deltas included
+RUN_RETENTION = float(os.getenv("RUN_RETENTION", "300")) # Seconds a finished run can still be replayed
+
+# Cache of complete council runs, keyed on the query, the models and the prompts
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256")) # Runs kept in memory
+CACHE_TTL = float(os.getenv("CACHE_TTL", "86400")) # Seconds before a cached run expires
+CACHE_DIR = os.getenv("CACHE_DIR", "") # Directory of the on-disk tier, disabled when empty
+CACHE_DISK_MAX_ENTRIES = int(os.getenv("CACHE_DISK_MAX_ENTRIES", "4096")) # Runs kept on disk, the least recently used are deleted beyond
+
 # All models used in the council, specify connection settings
 COUNCIL_MODELS = [
 
@@ -32,7 +115,11 @@ COUNCIL_MODELS = [
         ip="ollama", # Local ollama container (resolved with docker dns)
         port=OLLAMA_PORT,
         model_name="llama3.2:1b",
-        role=Role.CHAIRMAN
+        role=Role.CHAIRMAN,
+        num_parallel=OLLAMA_NUM_PARALLEL,
+        max_loaded_models=OLLAMA_MAX_LOADED_MODELS,
+        timeout=OLLAMA_TIMEOUT,
+        replicas=MODEL_REPLICAS.get("llama3.2:1b", [])
     ),
 
     # Council models (remote or host)
@@ -40,23 +127,72 @@ COUNCIL_MODELS = [
         ip="ollama", # Set the IP of a remote  PC with running ollama
         port=OLLAMA_PORT,
         model_name="qwen3:0.6b",
-        role=Role.COUNCILOR
-
+        role=Role.COUNCILOR,
+        num_parallel=OLLAMA_NUM_PARALLEL,
+        max_loaded_models=OLLAMA_MAX_LOADED_MODELS,
+        timeout=OLLAMA_TIMEOUT,
+        replicas=COUNCIL_REPLICAS + MODEL_REPLICAS.get("qwen3:0.6b", [])
     ),
     CouncilModel(
         ip="ollama", # Set the IP of a remote PC with running ollama
         port=OLLAMA_PORT,
         model_name="gemma3:1b",
-        role=Role.COUNCILOR
-
+        role=Role.COUNCILOR,
+        num_parallel=OLLAMA_NUM_PARALLEL,
+        max_loaded_models=OLLAMA_MAX_LOADED_MODELS,
+        timeout=OLLAMA_TIMEOUT,
+        replicas=COUNCIL_REPLICAS + MODEL_REPLICAS.get("gemma3:1b", [])
     ),
     CouncilModel(
         ip="ollama", # Set the IP of a remote PC with running ollama
         port=OLLAMA_PORT,
         model_name="qwen3:1.7b",
-        role=Role.COUNCILOR
+        role=Role.COUNCILOR,
+        num_parallel=OLLAMA_NUM_PARALLEL,
+        max_loaded_models=OLLAMA_MAX_LOADED_MODELS,
+        timeout=OLLAMA_TIMEOUT,
+        replicas=COUNCIL_REPLICAS + MODEL_REPLICAS.get("qwen3:1.7b", [])
     )
 ]
 
+# Conversation titles, named in the background by a lightweight model, or extracted from the question
+# > TITLE_MODEL : a small model outside the council, e.g. 'gemma3:270m', empty to only extract titles
+# > TITLE_MODEL_HOST : 'ip:port' of the ollama instance serving it, ideally not a councillor host
+TITLE_MODEL_NAME = os.getenv("TITLE_MODEL", "")
+TITLE_MODEL_HOST = os.getenv("TITLE_MODEL_HOST", f"{CHAIRMAN_IP}:{OLLAMA_PORT}")
+TITLE_TIMEOUT = float(os.getenv("TITLE_TIMEOUT", "20")) # Seconds before falling back to an extracted title
+
+TITLE_MODEL = CouncilModel(
+    ip=TITLE_MODEL_HOST.rpartition(":")[0],
+    port=int(TITLE_MODEL_HOST.rpartition(":")[2]),
+    model_name=TITLE_MODEL_NAME,
+    role=Role.TITLE,
+    num_parallel=OLLAMA_NUM_PARALLEL,
+    max_loaded_models=OLLAMA_MAX_LOADED_MODELS,
+    timeout=TITLE_TIMEOUT
+) if TITLE_MODEL_NAME else None
+
+# Conversation history, councillors get a rolling summary of the earlier turns and the last turns as is
+# > The summary is updated once per turn in the background, by the title model if any, by the chairman otherwise
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "true").lower() == "true"
+HISTORY_TURNS = int(os.getenv("HISTORY_TURNS", "2")) # Last turns (question and final answer) sent as is
+HISTORY_TURN_TOKENS = int(os.getenv("HISTORY_TURN_TOKENS", "300")) # Tokens kept of each question and answer of those turns
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300")) # Tokens of the summary of the earlier turns
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", "60")) # Seconds to update the summary, the turns are condensed without model beyond
+
 # Data directory for conversation storage
-DATA_DIR = "data/conversations"
\ No newline at end of file
+DATA_DIR = "data/conversations"
+
+# Threads running blocking storage I/O for the API
+STORAGE_WORKERS = int(os.getenv("STORAGE_WORKERS", "4"))
+
+# Superseded records (message and title updates) a conversation log can hold before being compacted
+STORAGE_COMPACT_THRESHOLD = int(os.getenv("STORAGE_COMPACT_THRESHOLD", "8"))
+
+# API worker processes, sharing the conversations through file locks
+# > The scheduler, host budgets and memory cache are per worker : COUNCIL_MAX_RUNS and the host budgets apply to each
+# > Metrics, status and jobs are published to WORKERS_DIR for every worker to serve, set by default with API_WORKERS > 1
+# > Set WORKERS_DIR when starting the workers another way, e.g. 'uvicorn main:app --workers 4'
+API_WORKERS = int(os.getenv("API_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+WORKERS_DIR = os.getenv("WORKERS_DIR", "data/workers" if API_WORKERS > 1 else "") # Directory shared by the workers, empty for a single worker
+WORKERS_PUBLISH_INTERVAL = float(os.getenv("WORKERS_PUBLISH_INTERVAL", "5")) # Seconds between two state publications
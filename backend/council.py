@@ -1,8 +1,215 @@
 """3-stage LLM Council orchestration."""
 
-from typing import List, Dict, Any, Tuple
-from ollama import query_models_parallel, query_model, check_model_health
-from config import COUNCIL_MODELS
+from typing import List, Dict, Any, Optional, Tuple
+from models import CouncilModel
+from ollama import query_models_parallel, query_model, check_model_health, DeltaCallback
+from config import COUNCIL_MODELS, PIPELINE_STAGE2, STAGE1_QUORUM, STAGE1_DEADLINE, STAGE1_STRAGGLERS
+from config import STAGE1_TIMEOUT, STAGE2_TIMEOUT, STAGE3_TIMEOUT
+from config import CACHE_ENABLED, CACHE_MAX_ENTRIES, CACHE_TTL, CACHE_DIR, CACHE_DISK_MAX_ENTRIES
+from config import PROMPT_CONTEXT_TOKENS, PROMPT_RESERVE_TOKENS, PROMPT_CHARS_PER_TOKEN, STAGE2_ANSWER_TOKENS, STAGE3_ANSWER_TOKENS, STAGE3_CRITIQUE_TOKENS, STAGE3_CRITIQUES
+from config import SYNTHESIS_MODE, TITLE_MODEL, TITLE_TIMEOUT
+from config import HISTORY_ENABLED, HISTORY_TURNS, HISTORY_TURN_TOKENS, HISTORY_SUMMARY_TOKENS, SUMMARY_TIMEOUT
+from cache import ResponseCache, make_key
+import budget
+import metrics
+import logs
+import asyncio
+import contextlib
+import logging
+import re
+
+logger = logs.get_logger("council")
+
+# Prompt templates, part of the cache key so that editing them invalidates cached runs
+STAGE1_PROMPT = "Répond à la demande : '{user_query}'. Reste synthétique, concis utilise des bullet points."
+
+# Opens the stage 1 messages of a conversation in progress, followed by its last turns
+HISTORY_PROMPT = """La demande suivante s'inscrit dans une conversation en cours. Résumé des échanges précédents :
+{summary}"""
+
+STAGE2_PROMPT = """Rôle: Juge impartial
+    Tu dois évaluer les différentes réponses des modèles d'IA :
+
+    Voici les réponses des différents modèles (anonymisés):
+
+    {responses_text}
+
+    Tes tâches:
+    1. En premier, évalue chaques réponses individuellement. Pour chaques réponses, explique ce qui est bien fait et ce qui est est mal fait.
+    2. Ensuite, à la fin de chaques réponses, donne une note finale.
+
+    IMPORTANT: La note finale DOIT être EXACTEMENT formattée de cette manière :
+
+    - Commencez par la ligne « CLASSEMENT FINAL : » (en majuscules, avec deux points)
+    - Listez ensuite les réponses de la meilleure à la moins bonne sous forme de liste numérotée.
+    - Chaque ligne doit contenir : un numéro, un point, un espace, puis UNIQUEMENT le libellé de la réponse (par exemple, « 1. Réponse A »).
+    - N'ajoutez aucun autre texte ni explication dans la section du classement.
+
+    Exemple de format de réponses, tu peux en ajouter ou en retirer selon le nombre de réponses que tu as reçu :
+
+    La réponse A fournit des détails pertinents sur X, mais omet Y…
+    La réponse B est exacte, mais manque de profondeur sur Z…
+    
+    FINAL RANKING:
+    1. Réponse ...
+    2. Réponse ...
+    
+    Veuillez maintenant fournir votre évaluation et votre classement :"""
+
+STAGE3_PROMPT = """Vous êtes le président d'un conseil de master en droit. Plusieurs modèles d'IA répondent à la question, puis ont classé leurs réponses respectives.
+
+    Phrase à analyser : {user_query}
+
+    Etape 1 - Réponse individuelle :
+    {stage1_text}
+
+    Etape 2 - Classement des pairs :
+    {stage2_text}
+    
+    Votre rôle de président est de synthétiser toutes ces informations afin de fournir une réponse unique, complète et précise à la question initiale de l'utilisateur. Prenez en compte :
+
+    - Les réponses individuelles et les enseignements qu'elles apportent
+    - Les classements par les pairs et ce qu'ils révèlent sur la qualité des réponses
+    - Les éventuels points de convergence ou de divergence
+    
+    Fournir une réponse finale claire et bien argumentée qui représente la sagesse collective du conseil :"""
+
+STAGE3_COMPACT_PROMPT = """Vous êtes le président d'un conseil de master en droit. Plusieurs modèles d'IA répondent à la question, puis ont classé leurs réponses respectives.
+
+    Phrase à analyser : {user_query}
+
+    Classement agrégé des pairs (rang moyen, plus bas est meilleur) :
+    {ranking_table}
+
+    Réponses individuelles, de la mieux classée à la moins bien classée :
+    {stage1_text}
+
+    Votre rôle de président est de synthétiser toutes ces informations afin de fournir une réponse unique, complète et précise à la question initiale de l'utilisateur. Prenez en compte :
+
+    - Les réponses individuelles et les enseignements qu'elles apportent
+    - Le classement des pairs, en vous appuyant d'abord sur les réponses les mieux classées
+    - Les éventuels points de convergence ou de divergence
+
+    Fournir une réponse finale claire et bien argumentée qui représente la sagesse collective du conseil :"""
+
+TITLE_PROMPT = """Créez un titre très court (3 à 5 mots maximum) qui résume la phrase suivante.
+    Le titre doit être concis et descriptif. N'utilisez ni guillemets ni ponctuation.
+
+    Phrase: {user_query}
+
+    Title:"""
+
+SUMMARY_PROMPT = """Vous tenez le résumé d'une conversation entre un utilisateur et un conseil de modèles d'IA.
+    Mettez le résumé à jour avec les nouveaux échanges. Gardez les demandes de l'utilisateur, les faits et les conclusions utiles pour la suite de la conversation.
+    Écrivez {max_words} mots au maximum, sans introduction.
+
+    Résumé actuel : {summary}
+
+    Nouveaux échanges :
+    {turns_text}
+
+    Résumé mis à jour :"""
+
+
+# Words left out of the extracted titles
+TITLE_STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "du", "de", "et", "ou", "en", "au", "aux", "à", "a", "est", "sont",
+    "que", "qui", "quoi", "quel", "quelle", "quels", "quelles", "comment", "pourquoi", "ce", "cette", "ces",
+    "mon", "ma", "mes", "son", "sa", "ses", "sur", "pour", "par", "dans", "avec", "il", "elle", "on", "je",
+    "tu", "nous", "vous", "ils", "elles", "y", "se", "me", "moi", "est-ce", "peux-tu", "pouvez-vous",
+    "the", "an", "of", "to", "is", "are", "what", "how", "why", "can", "you", "please"
+}
+
+
+def extract_title(user_query: str, max_words: int = 6) -> str:
+    """
+    Build a title from the first sentence of a question, without any model.
+
+    Args:
+        user_query: First question of the conversation
+        max_words: Words kept
+
+    Returns:
+        Title of at most 50 characters
+    """
+    first_sentence = re.split(r"(?<=[.?!])\s|\n", user_query.strip(), maxsplit=1)[0]
+
+    # Elided articles and pronouns (l', d', qu'...) are dropped with the stopwords
+    words = [re.sub(r"^(?:[cdjlmnst]|qu)['’]", "", word, flags=re.IGNORECASE) for word in re.findall(r"[\w'’-]+", first_sentence)]
+    words = [word for word in words if word]
+    kept = [word for word in words if word.lower() not in TITLE_STOPWORDS] or words
+
+    title = " ".join(kept[:max_words])
+    if not title:
+        return "Nouvelle conversation"
+
+    title = title[0].upper() + title[1:]
+
+    return title if len(title) <= 50 else title[:47] + "..."
+
+
+def conversation_turns(messages: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """
+    Pair the questions of a conversation with their final answers.
+
+    Questions left unanswered (failed or cancelled runs) are skipped, the
+    answer of a failed synthesis is left empty.
+
+    Args:
+        messages: Messages of the conversation
+
+    Returns:
+        List of (question, final answer) turns, oldest first
+    """
+    turns = []
+
+    for message, reply in zip(messages, messages[1:]):
+        if message["role"] == "user" and reply["role"] == "assistant":
+            stage3 = reply.get("stage3") or {}
+            turns.append((message["content"], "" if stage3.get("error") else stage3.get("response", "")))
+
+    return turns
+
+
+def condense_turns(summary: str, turns: List[Tuple[str, str]], max_tokens: int = HISTORY_SUMMARY_TOKENS) -> str:
+    """
+    Add turns to a summary without any model, one line per turn : the question and the first sentence of its answer.
+
+    Args:
+        summary: Current summary, empty if none
+        turns: Turns to add, oldest first
+        max_tokens: Tokens of the summary, the oldest lines are dropped beyond
+
+    Returns:
+        Updated summary
+    """
+    lines = summary.splitlines() if summary else []
+
+    for question, answer in turns:
+        first_sentence = re.split(r"(?<=[.?!])\s|\n", re.sub(r"<think>.*?</think>", "", answer, flags=re.DOTALL).strip(), maxsplit=1)[0]
+        line, _ = budget.truncate(f"- {' '.join(question.split())} : {first_sentence}", max_tokens // 4)
+        lines.append(line.replace("\n", " "))
+
+    while len(lines) > 1 and budget.estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+
+    return budget.truncate("\n".join(lines), max_tokens)[0]
+
+
+def clean_title(text: str) -> str:
+    """Clean up a generated title : reasoning, label, quotes and trailing punctuation removed, 50 characters at most."""
+    text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return ""
+
+    title = re.sub(r"^(?:titre|title)\s*:\s*", "", lines[0], flags=re.IGNORECASE)
+    title = title.strip('"\'*«» .!?:;')
+
+    # Truncate if too long
+    return title if len(title) <= 50 else title[:47] + "..."
+
 
 class Council() :
 
@@ -13,18 +220,57 @@ class Council() :
         self.chairman = self.models[0]
         self.models = self.models[1:]
 
-    async def stage1_collect_responses(self, user_query: str) -> List[Dict[str, Any]]:
+        # Lightweight model naming the conversations, None to extract titles from the questions
+        self.title_model = TITLE_MODEL
 
-    # On utilise un message 'system' pour définir le comportement
-        messages = [
-            {
-                "role": "user", 
-                "content": f"Répond à la demande : '{user_query}'. Reste synthétique, concis utilise des bullet points."
-            }
-        ]
+        # Cache of complete runs, None when disabled
+        self.cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL, CACHE_DIR or None, CACHE_DISK_MAX_ENTRIES) if CACHE_ENABLED else None
+
+    def models_named(self, names: List[str]) -> List[CouncilModel]:
+        """Get the councillors matching the given model names."""
+        return [model for model in self.models if model.model_name in names]
+
+    def stage1_messages(self, user_query: str, history: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+        """
+        Build the stage 1 messages sent to every councillor.
+
+        Args:
+            user_query: The user's question
+            history: Context of the conversation from conversation_history, None for a first question
+
+        Returns:
+            Chat messages : the summary of the earlier turns, the last turns and the question
+        """
+        messages = []
+
+        # On utilise un message 'system' pour donner le contexte de la conversation
+        if history is not None:
+            if history["summary"]:
+                messages.append({"role": "system", "content": HISTORY_PROMPT.format(summary=history["summary"])})
+
+            for question, answer in history["turns"]:
+                messages.append({"role": "user", "content": question})
+                messages.append({"role": "assistant", "content": answer})
+
+        messages.append({
+            "role": "user",
+            "content": STAGE1_PROMPT.format(user_query=user_query)
+        })
+
+        return messages
+
+    @metrics.timed_stage("stage1")
+    async def stage1_collect_responses(
+        self,
+        user_query: str,
+        on_delta: Optional[DeltaCallback] = None,
+        history: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+
+        messages = self.stage1_messages(user_query, history)
 
         # Appel parallèle des modèles
-        responses = await query_models_parallel(self.models, messages)
+        responses = await query_models_parallel(self.models, messages, on_delta=on_delta, deadline=STAGE1_TIMEOUT)
 
         # Formatage des résultats
         stage1_results = []
@@ -38,60 +284,163 @@ class Council() :
         return stage1_results
 
 
-    async def stage2_collect_rankings(
+    @metrics.timed_stage("stage1")
+    async def stage1_collect_quorum(
         self,
         user_query: str,
-        stage1_results: List[Dict[str, Any]]
-    ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        quorum: int = STAGE1_QUORUM,
+        deadline: Optional[float] = STAGE1_DEADLINE,
+        on_delta: Optional[DeltaCallback] = None,
+        history: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, asyncio.Task]]:
+        """
+        Collect stage 1 responses until a quorum or a deadline is met.
+
+        Returns as soon as `quorum` councillors answered, or once `deadline`
+        seconds have passed with at least one answer. Councillors that did not
+        answer yet keep running and are returned as pending tasks.
+
+        Args:
+            user_query: The user's question
+            quorum: Number of answers needed to move on to stage 2
+            deadline: Seconds to wait for the quorum, None to wait for it
+            on_delta: Optional callback receiving (model_name, delta) while streaming
+            history: Context of the conversation, see stage1_messages
+
+        Returns:
+            Tuple of (stage1_results, pending tasks by model name)
+        """
+        messages = self.stage1_messages(user_query, history)
+
+        tasks = {
+            asyncio.create_task(query_model(model, messages, on_delta=on_delta, deadline=STAGE1_TIMEOUT)): model.model_name
+            for model in self.models
+        }
+
+        loop = asyncio.get_running_loop()
+        expires_at = None if deadline is None else loop.time() + deadline
+
+        stage1_results = []
+        pending = set(tasks)
+
+        try:
+            while pending:
+                # Once the deadline passed, keep waiting only for the first answer
+                timeout = None
+                if expires_at is not None and loop.time() < expires_at:
+                    timeout = expires_at - loop.time()
+
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    response = task.result()
+                    if response and 'content' in response:
+                        stage1_results.append({
+                            "model": tasks[task],
+                            "response": response['content']
+                        })
+
+                deadline_met = expires_at is not None and loop.time() >= expires_at
+                if len(stage1_results) >= quorum or (deadline_met and stage1_results):
+                    break
+        except BaseException:
+            # The run was cancelled (client gone, job cancelled), asyncio.wait leaves the requests running
+            for task in tasks:
+                task.cancel()
+            raise
+
+        return stage1_results, {tasks[task]: task for task in pending}
+
+
+    @metrics.timed_stage("stage1_late")
+    async def stage1_collect_stragglers(
+        self,
+        pending: Dict[str, asyncio.Task],
+        policy: str = STAGE1_STRAGGLERS
+    ) -> List[Dict[str, Any]]:
+        """
+        Resolve the stage 1 requests left over by stage1_collect_quorum.
+
+        Args:
+            pending: Pending tasks by model name
+            policy: 'late' to wait for and keep the late answers, 'drop' to cancel them
+
+        Returns:
+            Late stage 1 results, flagged with 'late': True
+        """
+        if policy == "drop":
+            for task in pending.values():
+                task.cancel()
+            return []
 
+        responses = await asyncio.gather(*pending.values())
+
+        late_results = []
+        for model, response in zip(pending.keys(), responses):
+            if response and 'content' in response:
+                late_results.append({
+                    "model": model,
+                    "response": response['content'],
+                    "late": True
+                })
+
+        return late_results
+
+
+    def label_stage1_results(self, stage1_results: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Map the anonymized labels (Response A, Response B, ...) to model names."""
+        return {
+            f"Response {chr(65 + i)}": result['model']
+            for i, result in enumerate(stage1_results)
+        }
+
+
+    def stage2_prompt(self, stage1_results: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the ranking prompt, each answer cut to fit the prompt budget.
+
+        Args:
+            stage1_results: Stage 1 responses, in label order
+
+        Returns:
+            Tuple of (prompt, prompt size as reported in the run metrics)
+        """
         # Create anonymized labels for responses (Response A, Response B, etc.)
         labels = [chr(65 + i) for i in range(len(stage1_results))]  # A, B, C, ...
 
-        # Create mapping from label to model name
-        label_to_model = {
-            f"Response {label}": result['model']
-            for label, result in zip(labels, stage1_results)
-        }
+        available = budget.available_tokens(STAGE2_PROMPT.format(responses_text=""), len(stage1_results))
+        answers, truncated = budget.fit([result['response'] for result in stage1_results], available, STAGE2_ANSWER_TOKENS)
 
-        # Build the ranking prompt
         responses_text = "\n\n".join([
-            f"Response {label}:\n{result['response']}" if result['response'] else f"Response {label}:\n Aucune réponse reçue, ne considère pas ce résultat."
-            for label, result in zip(labels, stage1_results)
+            f"Response {label}:\n{answer}" if answer else f"Response {label}:\n Aucune réponse reçue, ne considère pas ce résultat."
+            for label, answer in zip(labels, answers)
         ])
 
-        ranking_prompt = f"""Rôle: Juge impartial
-    Tu dois évaluer les différentes réponses des modèles d'IA :
-
-    Voici les réponses des différents modèles (anonymisés):
+        ranking_prompt = STAGE2_PROMPT.format(responses_text=responses_text)
 
-    {responses_text}
+        return ranking_prompt, budget.prompt_size(ranking_prompt, available, len(truncated))
 
-    Tes tâches:
-    1. En premier, évalue chaques réponses individuellement. Pour chaques réponses, explique ce qui est bien fait et ce qui est est mal fait.
-    2. Ensuite, à la fin de chaques réponses, donne une note finale.
 
-    IMPORTANT: La note finale DOIT être EXACTEMENT formattée de cette manière :
-
-    - Commencez par la ligne « CLASSEMENT FINAL : » (en majuscules, avec deux points)
-    - Listez ensuite les réponses de la meilleure à la moins bonne sous forme de liste numérotée.
-    - Chaque ligne doit contenir : un numéro, un point, un espace, puis UNIQUEMENT le libellé de la réponse (par exemple, « 1. Réponse A »).
-    - N'ajoutez aucun autre texte ni explication dans la section du classement.
+    @metrics.timed_stage("stage2")
+    async def stage2_collect_rankings(
+        self,
+        user_query: str,
+        stage1_results: List[Dict[str, Any]],
+        reviewers: Optional[List[CouncilModel]] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
 
-    Exemple de format de réponses, tu peux en ajouter ou en retirer selon le nombre de réponses que tu as reçu :
+        # Create mapping from label to model name
+        label_to_model = self.label_stage1_results(stage1_results)
 
-    La réponse A fournit des détails pertinents sur X, mais omet Y…
-    La réponse B est exacte, mais manque de profondeur sur Z…
-    
-    FINAL RANKING:
-    1. Réponse ...
-    2. Réponse ...
-    
-    Veuillez maintenant fournir votre évaluation et votre classement :"""
+        # Build the ranking prompt
+        ranking_prompt, prompt_size = self.stage2_prompt(stage1_results)
 
         messages = [{"role": "user", "content": ranking_prompt}]
 
-        # Get rankings from all council models in parallel
-        responses = await query_models_parallel(self.models, messages)
+        # Get rankings from all council models in parallel, or only the given reviewers
+        responses = await query_models_parallel(reviewers or self.models, messages, deadline=STAGE2_TIMEOUT)
+
+        metrics.record_prompt("stage2", prompt_size, responses)
 
         # Format results
         stage2_results = []
@@ -108,54 +457,159 @@ class Council() :
         return stage2_results, label_to_model
 
 
-    async def stage3_synthesize_final(
+    def stage3_prompt(
         self,
         user_query: str,
         stage1_results: List[Dict[str, Any]],
-        stage2_results: List[Dict[str, Any]]
-    ) -> Dict[str, Any]:
+        stage2_results: List[Dict[str, Any]],
+        critiques: str = STAGE3_CRITIQUES
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the chairman prompt, answers and critiques cut to fit the prompt budget.
+
+        Args:
+            user_query: The user's question
+            stage1_results: Stage 1 responses
+            stage2_results: Stage 2 rankings
+            critiques: 'full' critiques, 'rankings' to keep only the parsed rankings,
+                'auto' to keep the rankings only when the full critiques do not fit
+
+        Returns:
+            Tuple of (prompt, prompt size as reported in the run metrics)
+        """
+        answers = [result['response'] for result in stage1_results]
+        rankings = [result['ranking'] for result in stage2_results]
+
+        available = budget.available_tokens(
+            STAGE3_PROMPT.format(user_query=user_query, stage1_text="", stage2_text=""),
+            len(answers) + len(rankings)
+        )
+
+        needed = budget.needed_tokens(answers, STAGE3_ANSWER_TOKENS) + budget.needed_tokens(rankings, STAGE3_CRITIQUE_TOKENS)
+        condensed = critiques == "rankings" or (critiques == "auto" and needed > available)
+
+        if condensed:
+            rankings = [budget.condense_critique(result) for result in stage2_results]
+
+        # The answers come first, the critiques get what they leave but at least half of the budget
+        critique_budget = max(available - budget.needed_tokens(answers, STAGE3_ANSWER_TOKENS), available // 2)
+        rankings, cut_rankings = budget.fit(rankings, critique_budget, STAGE3_CRITIQUE_TOKENS)
+        answers, cut_answers = budget.fit(answers, available - sum(map(budget.estimate_tokens, rankings)), STAGE3_ANSWER_TOKENS)
 
         # Build comprehensive context for chairman
         stage1_text = "\n\n".join([
-            f"Model: {result['model']}\nResponse: {result['response']}"
-            for result in stage1_results
+            f"Model: {result['model']}\nResponse: {answer}"
+            for result, answer in zip(stage1_results, answers)
         ])
 
         stage2_text = "\n\n".join([
-            f"Model: {result['model']}\nRanking: {result['ranking']}"
-            for result in stage2_results
+            f"Model: {result['model']}\nRanking: {ranking}"
+            for result, ranking in zip(stage2_results, rankings)
         ])
 
-        chairman_prompt = f"""Vous êtes le président d'un conseil de master en droit. Plusieurs modèles d'IA répondent à la question, puis ont classé leurs réponses respectives.
+        chairman_prompt = STAGE3_PROMPT.format(
+            user_query=user_query,
+            stage1_text=stage1_text,
+            stage2_text=stage2_text
+        )
 
-    Phrase à analyser : {user_query}
+        return chairman_prompt, budget.prompt_size(chairman_prompt, available, len(cut_answers) + len(cut_rankings), condensed)
 
-    Etape 1 - Réponse individuelle :
-    {stage1_text}
 
-    Etape 2 - Classement des pairs :
-    {stage2_text}
-    
-    Votre rôle de président est de synthétiser toutes ces informations afin de fournir une réponse unique, complète et précise à la question initiale de l'utilisateur. Prenez en compte :
+    def stage3_compact_prompt(
+        self,
+        user_query: str,
+        stage1_results: List[Dict[str, Any]],
+        aggregate_rankings: List[Dict[str, Any]]
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build the chairman prompt of the compact synthesis : the answers ordered by aggregate rank and the rank table, without the critiques.
 
-    - Les réponses individuelles et les enseignements qu'elles apportent
-    - Les classements par les pairs et ce qu'ils révèlent sur la qualité des réponses
-    - Les éventuels points de convergence ou de divergence
-    
-    Fournir une réponse finale claire et bien argumentée qui représente la sagesse collective du conseil :"""
-        
-        print(chairman_prompt)
+        Args:
+            user_query: The user's question
+            stage1_results: Stage 1 responses
+            aggregate_rankings: Aggregate rankings from calculate_aggregate_rankings
+
+        Returns:
+            Tuple of (prompt, prompt size as reported in the run metrics)
+        """
+        ranks = {entry['model']: position for position, entry in enumerate(aggregate_rankings)}
+
+        # Unranked answers (late or not parsed by any reviewer) come last, in their stage 1 order
+        ordered = sorted(stage1_results, key=lambda result: ranks.get(result['model'], len(ranks)))
+
+        ranking_table = "\n".join(
+            f"{position}. {entry['model']} : rang moyen {entry['average_rank']} ({entry['rankings_count']} votes)"
+            for position, entry in enumerate(aggregate_rankings, start=1)
+        ) or "Aucun classement exploitable."
+
+        template = STAGE3_COMPACT_PROMPT.format(user_query=user_query, ranking_table=ranking_table, stage1_text="")
+        available = budget.available_tokens(template, len(ordered))
+        answers, truncated = budget.fit([result['response'] for result in ordered], available, STAGE3_ANSWER_TOKENS)
+
+        stage1_text = "\n\n".join([
+            f"Model: {result['model']}" + ("" if result['model'] in ranks else " (non classée)") + f"\nResponse: {answer}"
+            for result, answer in zip(ordered, answers)
+        ])
+
+        chairman_prompt = STAGE3_COMPACT_PROMPT.format(
+            user_query=user_query,
+            ranking_table=ranking_table,
+            stage1_text=stage1_text
+        )
+
+        return chairman_prompt, budget.prompt_size(chairman_prompt, available, len(truncated), condensed=True)
+
+
+    @metrics.timed_stage("stage3")
+    async def stage3_synthesize_final(
+        self,
+        user_query: str,
+        stage1_results: List[Dict[str, Any]],
+        stage2_results: List[Dict[str, Any]],
+        on_delta: Optional[DeltaCallback] = None,
+        aggregate_rankings: Optional[List[Dict[str, Any]]] = None,
+        mode: str = SYNTHESIS_MODE
+    ) -> Dict[str, Any]:
+        """
+        Synthesize the final answer with the chairman.
+
+        Args:
+            user_query: The user's question
+            stage1_results: Stage 1 responses
+            stage2_results: Stage 2 rankings
+            on_delta: Optional callback receiving (model_name, delta) while streaming
+            aggregate_rankings: Aggregate rankings, required by the compact mode
+            mode: 'full' to show the answers and critiques, 'compact' to show the answers
+                ordered by aggregate rank and the rank table instead of the critiques
+
+        Returns:
+            Stage 3 result with the chairman model and its response
+        """
+        if mode == "compact" and aggregate_rankings is not None:
+            chairman_prompt, prompt_size = self.stage3_compact_prompt(user_query, stage1_results, aggregate_rankings)
+            prompt_size["synthesis"] = "compact"
+        else:
+            chairman_prompt, prompt_size = self.stage3_prompt(user_query, stage1_results, stage2_results)
+            prompt_size["synthesis"] = "full"
+
+        # Prompts are several kilobytes, only a sample is logged
+        if logger.isEnabledFor(logging.DEBUG) and logs.sampled():
+            logger.debug("Chairman prompt", extra={"model": self.chairman.model_name, **logs.payload(chairman_prompt)})
 
         messages = [{"role": "user", "content": chairman_prompt}]
 
         # Query the chairman model
-        response = await query_model(self.chairman, messages)
+        response = await query_model(self.chairman, messages, on_delta=on_delta, deadline=STAGE3_TIMEOUT)
+
+        metrics.record_prompt("stage3", prompt_size, {self.chairman.model_name: response})
 
         if response is None:
             # Fallback if chairman fails
             return {
                 "model": self.chairman.model_name,
-                "response": "Error: Impossible de générer la synthèse finale."
+                "response": "Error: Impossible de générer la synthèse finale.",
+                "error": True
             }
 
         return {
@@ -236,48 +690,317 @@ class Council() :
         return aggregate
 
 
+    @metrics.timed_stage("title")
     async def generate_conversation_title(self, user_query: str) -> str:
-        title_prompt = f"""Créez un titre très court (3 à 5 mots maximum) qui résume la phrase suivante.
-    Le titre doit être concis et descriptif. N'utilisez ni guillemets ni ponctuation.
+        """
+        Name a conversation after its first question.
 
-    Phrase: {user_query}
+        The title model is a lightweight model outside the council, its
+        requests wait for the council requests of its host. Without title
+        model, or when it fails, the title is extracted from the question.
 
-    Title:"""
+        Args:
+            user_query: First question of the conversation
+
+        Returns:
+            Title of at most 50 characters
+        """
+        if self.title_model is None:
+            return extract_title(user_query)
+
+        title_prompt = TITLE_PROMPT.format(user_query=user_query)
 
         messages = [{"role": "user", "content": title_prompt}]
 
-        # Use gemini-2.5-flash for title generation (fast and cheap)
-        response = await query_model(self.models[0], messages)
+        response = await query_model(self.title_model, messages, deadline=TITLE_TIMEOUT)
 
         if response is None:
-            # Fallback to a generic title
-            return "Nouvelle conversation"
+            return extract_title(user_query)
+
+        return clean_title(response.get('content', '')) or extract_title(user_query)
+
+
+    def start_title(self, user_query: str) -> asyncio.Task:
+        """Generate the title of a new conversation in the background, alongside the council run."""
+        return asyncio.create_task(self.generate_conversation_title(user_query))
 
-        title = response.get('message.content', 'Nouvelle conversation').strip()
 
-        # Clean up the title - remove quotes, limit length
-        title = title.strip('"\'')
+    async def collect_title(self, task: asyncio.Task, user_query: str) -> str:
+        """
+        Get the title of a background task without waiting for it.
+
+        Args:
+            task: Task from start_title
+            user_query: First question of the conversation
 
-        # Truncate if too long
-        if len(title) > 50:
-            title = title[:47] + "..."
+        Returns:
+            Generated title, or the extracted one if the task is still running (it is cancelled)
+        """
+        if not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            return extract_title(user_query)
 
-        return title
+        return task.result()
 
 
-    async def run_full_council(self, user_query: str) -> Tuple[List, List, Dict, Dict]:
+    def conversation_history(self, conversation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Build the context of a new question : summary of the earlier turns and the last turns.
+
+        Its size is bounded whatever the length of the conversation. Turns
+        the saved summary does not cover yet (update late or failed) are
+        condensed into it without any model.
+
+        Args:
+            conversation: Conversation before the new question
+
+        Returns:
+            Dictionary with the summary and the last (question, answer) turns, None without earlier turns
+        """
+        turns = conversation_turns(conversation["messages"]) if HISTORY_ENABLED else []
+        if not turns:
+            return None
+
+        recent = max(len(turns) - HISTORY_TURNS, 0)
+        saved = conversation.get("summary") or {"text": "", "turns": 0}
+
+        summary = saved["text"]
+        if saved["turns"] < recent:
+            summary = condense_turns(summary, turns[saved["turns"]:recent])
+
+        return {
+            "summary": summary,
+            "turns": [
+                (budget.truncate(question, HISTORY_TURN_TOKENS)[0], budget.truncate(answer, HISTORY_TURN_TOKENS)[0])
+                for question, answer in turns[recent:]
+            ]
+        }
+
+
+    @metrics.timed_stage("summary")
+    async def summarize_turns(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        """
+        Fold turns into the summary of a conversation.
+
+        Written by the title model if any, by the chairman otherwise. When
+        the model fails, the turns are condensed without it.
+
+        Args:
+            summary: Current summary, empty if none
+            turns: Turns leaving the window of the last turns, oldest first
+
+        Returns:
+            Updated summary of at most HISTORY_SUMMARY_TOKENS tokens
+        """
+        turns_text = "\n\n".join(
+            f"Utilisateur : {budget.truncate(question, HISTORY_TURN_TOKENS)[0]}\nConseil : {budget.truncate(answer, HISTORY_TURN_TOKENS)[0]}"
+            for question, answer in turns
+        )
+
+        summary_prompt = SUMMARY_PROMPT.format(
+            max_words=int(HISTORY_SUMMARY_TOKENS * PROMPT_CHARS_PER_TOKEN / 6),
+            summary=summary or "aucun, début de la conversation.",
+            turns_text=turns_text
+        )
+
+        messages = [{"role": "user", "content": summary_prompt}]
+
+        response = await query_model(self.title_model or self.chairman, messages, deadline=SUMMARY_TIMEOUT)
+
+        text = re.sub(r"<think>.*?</think>", "", (response or {}).get('content', ''), flags=re.DOTALL).strip()
+        if not text:
+            return condense_turns(summary, turns)
+
+        return budget.truncate(text, HISTORY_SUMMARY_TOKENS)[0]
+
+
+    async def summarize(self, conversation: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+        """
+        Update the summary of a conversation once its last turn is saved.
+
+        Only the turns leaving the window of the last HISTORY_TURNS turns are
+        folded in, each turn is summarized once.
+
+        Args:
+            conversation: Conversation with its last answer
+
+        Returns:
+            Tuple of (summary, number of turns covered), None if it is up to date
+        """
+        turns = conversation_turns(conversation["messages"]) if HISTORY_ENABLED else []
+        covered = len(turns) - HISTORY_TURNS
+        saved = conversation.get("summary") or {"text": "", "turns": 0}
+
+        if covered <= saved["turns"]:
+            return None
+
+        return await self.summarize_turns(saved["text"], turns[saved["turns"]:covered]), covered
+
+
+    def cache_key(self, user_query: str, history: Optional[Dict[str, Any]] = None) -> str:
+        """Build the cache key of a run, from the query, its conversation context, the models and the prompts."""
+        # Keys of first questions are left unchanged by the history
+        context = {"history": [HISTORY_PROMPT, history]} if history is not None else {}
+
+        return make_key(
+            user_query,
+            [self.chairman.model_name] + [model.model_name for model in self.models],
+            [STAGE1_PROMPT, STAGE2_PROMPT, STAGE3_COMPACT_PROMPT if SYNTHESIS_MODE == "compact" else STAGE3_PROMPT],
+            budget=[PROMPT_CONTEXT_TOKENS, PROMPT_RESERVE_TOKENS, STAGE2_ANSWER_TOKENS, STAGE3_ANSWER_TOKENS, STAGE3_CRITIQUE_TOKENS, STAGE3_CRITIQUES],
+            **context
+        )
+
+
+    async def get_cached_run(self, user_query: str, history: Optional[Dict[str, Any]] = None) -> Optional[Tuple[List, List, Dict, Dict]]:
+        """
+        Look up a previous run of the same query in the same context.
+
+        Args:
+            user_query: The user's question
+            history: Context of the conversation, None for a first question
+
+        Returns:
+            Tuple of (stage1, stage2, stage3, metadata) on hit, None otherwise
+        """
+        if self.cache is None:
+            return None
+
+        cached = await self.cache.get(self.cache_key(user_query, history))
+        if cached is None:
+            return None
+
+        cached["metadata"]["cached"] = True
+
+        return cached["stage1"], cached["stage2"], cached["stage3"], cached["metadata"]
+
+
+    async def cache_run(
+        self,
+        user_query: str,
+        stage1_results: List[Dict[str, Any]],
+        stage2_results: List[Dict[str, Any]],
+        stage3_result: Dict[str, Any],
+        metadata: Dict[str, Any],
+        history: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Store a successful run in the cache under its conversation context, failed runs are never cached."""
+        if self.cache is None or not stage1_results or stage3_result.get("error"):
+            return
+
+        # Timings and cache flags describe this run only
+        metadata = {key: value for key, value in metadata.items() if key not in ("metrics", "cached")}
+
+        await self.cache.put(self.cache_key(user_query, history), {
+            "stage1": stage1_results,
+            "stage2": stage2_results,
+            "stage3": stage3_result,
+            "metadata": metadata
+        })
+
+
+    async def rerun_stages(
+        self,
+        user_query: str,
+        stage1_results: List[Dict[str, Any]],
+        stage2_results: Optional[List[Dict[str, Any]]] = None,
+        from_stage: int = 2
+    ) -> Tuple[List, Dict, Dict]:
+        """
+        Re-run stage 2 and/or stage 3 from saved results, without querying stage 1 again.
+
+        Args:
+            user_query: The user's question
+            stage1_results: Saved stage 1 responses
+            stage2_results: Saved stage 2 rankings, required when from_stage is 3
+            from_stage: 2 to re-rank and re-synthesize, 3 to re-synthesize only
+
+        Returns:
+            Tuple of (stage2_results, stage3_result, metadata)
+        """
+        with metrics.collect_run() as timings:
+            if from_stage == 2:
+                stage2_results, label_to_model = await self.stage2_collect_rankings(user_query, stage1_results)
+            else:
+                label_to_model = self.label_stage1_results(stage1_results)
+
+            aggregate_rankings = self.calculate_aggregate_rankings(stage2_results, label_to_model)
+
+            stage3_result = await self.stage3_synthesize_final(user_query, stage1_results, stage2_results, aggregate_rankings=aggregate_rankings)
+
+        metrics.record_run(stage3_result)
+
+        metadata = {
+            "label_to_model": label_to_model,
+            "aggregate_rankings": aggregate_rankings,
+            "metrics": timings.summary()
+        }
+
+        return stage2_results, stage3_result, metadata
+
+
+    async def run_full_council(
+        self,
+        user_query: str,
+        pipelined: bool = PIPELINE_STAGE2,
+        use_cache: bool = True,
+        history: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List, List, Dict, Dict]:
+        with metrics.collect_run() as timings:
+            stage1_results, stage2_results, stage3_result, metadata = await self.run_stages(user_query, pipelined, use_cache, history)
+
+        metadata["metrics"] = timings.summary()
+        metrics.record_run(stage3_result, cached=metadata.get("cached", False))
+
+        return stage1_results, stage2_results, stage3_result, metadata
+
+
+    async def run_stages(
+        self,
+        user_query: str,
+        pipelined: bool,
+        use_cache: bool,
+        history: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List, List, Dict, Dict]:
+        """Run the 3 stages of run_full_council, or answer from the cache."""
+        # Identical questions in the same context are answered from the cache
+        if use_cache:
+            cached = await self.get_cached_run(user_query, history)
+            if cached is not None:
+                return cached
+
         # Stage 1: Collect individual responses
-        stage1_results = await self.stage1_collect_responses(user_query)
+        pending = {}
+        if pipelined:
+            # Move on to stage 2 once a quorum answered, stragglers are handled after
+            stage1_results, pending = await self.stage1_collect_quorum(user_query, history=history)
+        else:
+            stage1_results = await self.stage1_collect_responses(user_query, history=history)
 
         # If no models responded successfully, return error
         if not stage1_results:
             return [], [], {
                 "model": "error",
-                "response": "Aucun modèle n'a réussi à répondre. Veuillez réessayer."
+                "response": "Aucun modèle n'a réussi à répondre. Veuillez réessayer.",
+                "error": True
             }, {}
 
-        # Stage 2: Collect rankings
-        stage2_results, label_to_model = await self.stage2_collect_rankings(user_query, stage1_results)
+        included_models = [result['model'] for result in stage1_results]
+
+        try:
+            # Stage 2: Collect rankings, reviewers are the councillors that already answered
+            reviewers = self.models_named(included_models) if pipelined else None
+            stage2_results, label_to_model = await self.stage2_collect_rankings(user_query, stage1_results, reviewers)
+
+            # Late answers are shown to the chairman but were not peer reviewed
+            late_results = await self.stage1_collect_stragglers(pending) if pending else []
+        finally:
+            # Stragglers left running when stage 2 fails or the run is cancelled
+            for task in pending.values():
+                task.cancel()
+
+        stage1_results = stage1_results + late_results
 
         # Calculate aggregate rankings
         aggregate_rankings = self.calculate_aggregate_rankings(stage2_results, label_to_model)
@@ -286,7 +1009,8 @@ class Council() :
         stage3_result = await self.stage3_synthesize_final(
             user_query,
             stage1_results,
-            stage2_results
+            stage2_results,
+            aggregate_rankings=aggregate_rankings
         )
 
         # Prepare metadata
@@ -295,4 +1019,14 @@ class Council() :
             "aggregate_rankings": aggregate_rankings
         }
 
+        if pipelined:
+            metadata["included_models"] = included_models
+            metadata["late_models"] = [result['model'] for result in late_results]
+            metadata["dropped_models"] = [
+                model for model in pending if model not in metadata["late_models"]
+            ]
+
+        await self.cache_run(user_query, stage1_results, stage2_results, stage3_result, metadata, history)
+        metadata["cached"] = False
+
         return stage1_results, stage2_results, stage3_result, metadata
@@ -0,0 +1,124 @@
+"""Per-host request dispatching, matched to what an Ollama host keeps resident."""
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Tuple
+
+
+class HostDispatcher():
+    """
+    Gate the requests sent to one Ollama host.
+
+    At most `max_loaded` distinct models run at once (OLLAMA_MAX_LOADED_MODELS),
+    each with at most `num_parallel` requests (OLLAMA_NUM_PARALLEL). Waiting
+    requests for a model already running, then for a model recently resident,
+    go first so that the host does not swap weights in and out of memory.
+    Background requests (conversation titles) start only when no other
+    request is waiting.
+    """
+
+    def __init__(self, max_loaded: int = 1, num_parallel: int = 1):
+
+        self.max_loaded = max_loaded
+        self.num_parallel = num_parallel
+
+        # Requests in flight by model
+        self.active : Dict[str, int] = {}
+
+        # Models most recently run, likely still loaded by ollama
+        self.resident : Deque[str] = deque(maxlen=max_loaded)
+
+        # Waiting requests : model name, future set when granted, background flag
+        self.waiters : List[Tuple[str, asyncio.Future, bool]] = []
+
+    @asynccontextmanager
+    async def slot(self, model_name: str, background: bool = False) -> AsyncIterator[None]:
+        """Hold a request slot for a model while the context is open."""
+        await self.acquire(model_name, background)
+        try:
+            yield
+        finally:
+            self.release(model_name)
+
+    async def acquire(self, model_name: str, background: bool = False) -> None:
+        """
+        Wait for a request slot for a model.
+
+        Args:
+            model_name: Name of the model queried
+            background: Low priority request, granted only when no other request waits
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append((model_name, future, background))
+        self.dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted right before being cancelled, give the slot back
+                self.release(model_name)
+            else:
+                self.waiters = [waiter for waiter in self.waiters if waiter[1] is not future]
+            raise
+
+    def release(self, model_name: str) -> None:
+        """
+        Give back a request slot.
+
+        Args:
+            model_name: Name of the model queried
+        """
+        self.active[model_name] -= 1
+
+        if self.active[model_name] == 0:
+            del self.active[model_name]
+
+        self.dispatch()
+
+    def can_run(self, model_name: str) -> bool:
+        """Check whether a request for a model can start now."""
+        if model_name in self.active:
+            return self.active[model_name] < self.num_parallel
+        return len(self.active) < self.max_loaded
+
+    def dispatch(self) -> None:
+        """Grant slots to waiting requests, running and resident models first."""
+        def priority(waiter: Tuple[str, asyncio.Future, bool]) -> int:
+            name, _, background = waiter
+            if background:
+                return 3
+            if name in self.active:
+                return 0
+            if name in self.resident:
+                return 1
+            return 2
+
+        # Stable sort keeps FIFO order within a priority
+        foreground_waiting = False
+        for name, future, background in sorted(self.waiters, key=priority):
+            if future.done():
+                continue
+
+            # Background requests never take a slot ahead of a waiting request
+            if not self.can_run(name) or (background and foreground_waiting):
+                foreground_waiting = foreground_waiting or not background
+                continue
+
+            self.active[name] = self.active.get(name, 0) + 1
+            if name not in self.resident:
+                self.resident.append(name)
+
+            future.set_result(None)
+
+        self.waiters = [waiter for waiter in self.waiters if not waiter[1].done()]
+
+    def stats(self) -> Dict[str, object]:
+        """Get the dispatcher state."""
+        return {
+            "max_loaded": self.max_loaded,
+            "num_parallel": self.num_parallel,
+            "active": dict(self.active),
+            "waiting": len(self.waiters)
+        }
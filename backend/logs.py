@@ -0,0 +1,151 @@
+"""Structured logging : non-blocking queue handler, correlation ids and sampling of large payloads."""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_PAYLOAD_CHARS, LOG_PAYLOAD_SAMPLE_RATE
+
+# Correlation ids of the running request, inherited by the tasks it creates
+request_id : contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+conversation_id : contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("conversation_id", default=None)
+
+# Attributes of every log record, anything else was passed with `extra`
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener : Optional[logging.handlers.QueueListener] = None
+
+
+class CorrelationFilter(logging.Filter):
+    """Add the request and conversation ids to the records, in the thread logging them."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        record.conversation_id = conversation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, with their `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+
+        entry.update({
+            key: value for key, value in vars(record).items()
+            if key not in STANDARD_ATTRIBUTES and value is not None
+        })
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Format records on one readable line, with their `extra` fields as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s : %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(
+            f"{key}={value}" for key, value in vars(record).items()
+            if key not in STANDARD_ATTRIBUTES and value is not None
+        )
+        return super().format(record) + (f" [{fields}]" if fields else "")
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """
+    Send the council logs through a queue, written to stdout by a background thread.
+
+    Logging calls only enqueue the record, the event loop never waits on
+    stdout. Calling it again does nothing, the first setup wins.
+
+    Args:
+        level: Minimum level, e.g. 'INFO' or 'DEBUG'
+        fmt: 'json' for one JSON object per line, 'text' for readable lines
+    """
+    global _listener
+
+    if _listener is not None:
+        return
+
+    logger = logging.getLogger("council")
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    records : queue.SimpleQueue = queue.SimpleQueue()
+
+    handler = logging.handlers.QueueHandler(records)
+    handler.addFilter(CorrelationFilter())
+    logger.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Write the queued records and stop the background thread."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Get the logger of a backend module."""
+    return logging.getLogger(f"council.{name}")
+
+
+@contextmanager
+def correlate(request: Optional[str] = None, conversation: Optional[str] = None) -> Iterator[None]:
+    """Tag the records logged within the context with a request and/or conversation id."""
+    tokens = []
+
+    if request is not None:
+        tokens.append((request_id, request_id.set(request)))
+    if conversation is not None:
+        tokens.append((conversation_id, conversation_id.set(conversation)))
+
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def payload(text: str, limit: int = LOG_PAYLOAD_CHARS) -> Dict[str, Any]:
+    """
+    Get the fields describing a large payload (prompt, answer) for a record.
+
+    Args:
+        text: Payload to log
+        limit: Characters kept, the rest is cut
+
+    Returns:
+        Dictionary with the payload size and its beginning
+    """
+    return {
+        "payload_chars": len(text),
+        "payload": text if len(text) <= limit else text[:limit] + f"... [{len(text) - limit} more chars]"
+    }
+
+
+def sampled(rate: float = LOG_PAYLOAD_SAMPLE_RATE) -> bool:
+    """Check whether this occurrence of a frequent large payload should be logged."""
+    return rate > 0 and random.random() < rate
@@ -1,18 +1,38 @@
 """FastAPI backend for LLM Council."""
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, AsyncIterator, Optional, Set, Tuple
+from contextlib import asynccontextmanager
 import uuid
 import json
 import asyncio
-
-import storage
+import os
+import time
+
+import async_storage
+import ollama
+import metrics
+import logs
+import runs
+import workers
 from council import Council
+from scheduler import CouncilScheduler, QueueFullError
+from runs import CouncilRun, RunRegistry
+from bootstrap import ModelBootstrap
+from config import COUNCIL_MODELS, TITLE_MODEL, PIPELINE_STAGE2, COUNCIL_MAX_RUNS, COUNCIL_MAX_QUEUE
+from config import WARMUP_ENABLED, WARMUP_INTERVAL, HEALTH_CHECK_INTERVAL, RUN_BUFFER_EVENTS, RUN_RETENTION
+from config import PROVISION_RETRY_DELAY, PROVISION_RETRY_MAX_DELAY
+from config import API_WORKERS, WORKERS_DIR
 from models import CouncilModel
 
+logger = logs.get_logger("api")
+
+# Models provisioned and routed by the API : the council and the title model, if any
+SERVED_MODELS = COUNCIL_MODELS + ([TITLE_MODEL] if TITLE_MODEL else [])
+
 class CreateConversationRequest(BaseModel):
     """Request to create a new conversation."""
     pass
@@ -21,6 +41,13 @@ class CreateConversationRequest(BaseModel):
 class SendMessageRequest(BaseModel):
     """Request to send a message in a conversation."""
     content: str
+    pipelined: Optional[bool] = None  # Start stage 2 on a stage 1 quorum, defaults to PIPELINE_STAGE2
+    use_cache: bool = True  # Set to False to bypass cached runs
+
+
+class RerunStagesRequest(BaseModel):
+    """Request to re-run the last stages of an assistant message."""
+    from_stage: int = Field(3, ge=2, le=3)  # 2 : re-rank and re-synthesize, 3 : re-synthesize only
 
 
 class ConversationMetadata(BaseModel):
@@ -37,6 +64,7 @@ class Conversation(BaseModel):
     created_at: str
     title: str
     messages: List[Dict[str, Any]]
+    summary: Optional[Dict[str, Any]] = None  # Rolling summary of the earlier turns, with the number of turns it covers
 
 class LLMModel(BaseModel):
     """Required model data for registration."""
@@ -46,7 +74,67 @@ class LLMModel(BaseModel):
     model_role: int
 
 
-app = FastAPI(title="LLM Council API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the council, open the ollama clients and bootstrap the models on startup, release everything on shutdown."""
+    global council
+
+    logs.setup_logging()
+
+    # Built in each worker process, unless already set (benchmarks)
+    if council is None:
+        council = Council()
+
+    ollama.open_clients(SERVED_MODELS)
+    ollama.configure_hosts(SERVED_MODELS)
+
+    # Provision and load the models in the background, the API is live but not ready meanwhile
+    bootstrap.start()
+
+    # Share the metrics, status and jobs of this worker with the others
+    shared_tasks = []
+    if workers.SHARED:
+        shared_tasks = [
+            asyncio.create_task(workers.run_publisher(worker_state)),
+            asyncio.create_task(run_registry.watch_cancellations())
+        ]
+
+    yield
+
+    for task in shared_tasks + list(summary_tasks):
+        task.cancel()
+    await asyncio.gather(*shared_tasks, *summary_tasks, return_exceptions=True)
+
+    await run_registry.shutdown()
+    await bootstrap.stop()
+    await ollama.close_clients()
+    async_storage.shutdown()
+
+    if workers.SHARED:
+        workers.withdraw()
+
+    logs.shutdown_logging()
+
+
+app = FastAPI(title="LLM Council API", lifespan=lifespan)
+
+# The council, built on startup
+council : Optional[Council] = None
+
+# Bounds the council runs processed at once, others wait in a FIFO queue
+scheduler = CouncilScheduler(COUNCIL_MAX_RUNS, COUNCIL_MAX_QUEUE)
+
+# Streamed runs, followed and resumed by the clients, polled from any worker
+run_registry = RunRegistry(RUN_BUFFER_EVENTS, RUN_RETENTION, os.path.join(WORKERS_DIR, "jobs") if workers.SHARED else None)
+
+# Conversation summaries being updated, referenced until done
+summary_tasks : Set[asyncio.Task] = set()
+
+# Provisions and preloads the council models, tracks readiness
+bootstrap = ModelBootstrap(
+    SERVED_MODELS, WARMUP_ENABLED, WARMUP_INTERVAL, HEALTH_CHECK_INTERVAL,
+    retry_delay=PROVISION_RETRY_DELAY, max_retry_delay=PROVISION_RETRY_MAX_DELAY
+)
 
 # Enable CORS for local development
 app.add_middleware(
@@ -55,31 +143,355 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Run-ID", "X-Request-ID"],
 )
 
+
+@app.middleware("http")
+async def correlate_requests(request: Request, call_next):
+    """Tag the logs of each request with its id, taken from X-Request-ID or generated."""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    started = time.monotonic()
+
+    with logs.correlate(request=request_id):
+        response = await call_next(request)
+
+        logger.info("Request handled", extra={
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "seconds": round(time.monotonic() - started, 3)
+        })
+
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+def sse_event(event: Dict[str, Any]) -> str:
+    """Format an event as a Server-Sent Events data line."""
+    return f"data: {json.dumps(event)}\n\n"
+
+
+async def drain_events(queue: asyncio.Queue, task: asyncio.Task) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield events pushed to a queue until the task producing them is done.
+
+    Args:
+        queue: Queue filled by the task while it runs
+        task: Running task, its result is left for the caller to read
+
+    Yields:
+        Events in the order they were queued
+    """
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            try:
+                done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not getter.done():
+                    getter.cancel()
+
+            if getter in done:
+                yield getter.result()
+
+            if task.done():
+                # Flush what was queued right before completion
+                while not queue.empty():
+                    yield queue.get_nowait()
+                return
+
+    finally:
+        # The run was cancelled or its client left, stop querying the models
+        if not task.done():
+            task.cancel()
+
+
+async def stream_council_run(
+    user_query: str,
+    pipelined: bool,
+    run: Dict[str, Any],
+    history: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the 3-stage council process, yielding events as each stage progresses.
+
+    Args:
+        user_query: The user's question
+        pipelined: Start stage 2 on a stage 1 quorum
+        run: Filled with the (stage1, stage2, stage3, metadata) tuple under 'result', with the run timings in metadata
+        history: Context of the conversation for the councillors, None for a first question
+
+    Yields:
+        SSE events, including token deltas for stages 1 and 3
+    """
+    with metrics.collect_run() as timings:
+        async for event in stream_council_stages(user_query, pipelined, run, history):
+            yield event
+
+    run["result"][3]["metrics"] = timings.summary()
+    metrics.record_run(run["result"][2])
+
+
+async def stream_council_stages(
+    user_query: str,
+    pipelined: bool,
+    run: Dict[str, Any],
+    history: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield the events of the 3 stages, see stream_council_run."""
+    # Token deltas are pushed here by the streaming stages
+    deltas = asyncio.Queue()
+
+    def on_stage1_delta(model, delta):
+        deltas.put_nowait({'type': 'stage1_delta', 'model': model, 'delta': delta})
+
+    def on_stage3_delta(model, delta):
+        deltas.put_nowait({'type': 'stage3_delta', 'model': model, 'delta': delta})
+
+    # Stage 1: Collect responses, forwarding tokens as they arrive
+    yield {'type': 'stage1_start'}
+    if pipelined:
+        stage1_task = asyncio.create_task(council.stage1_collect_quorum(user_query, on_delta=on_stage1_delta, history=history))
+    else:
+        stage1_task = asyncio.create_task(council.stage1_collect_responses(user_query, on_delta=on_stage1_delta, history=history))
+    async for event in drain_events(deltas, stage1_task):
+        yield event
+
+    pending = {}
+    try:
+        reviewers = None
+        if pipelined:
+            stage1_results, pending = stage1_task.result()
+            included_models = [result['model'] for result in stage1_results]
+            reviewers = council.models_named(included_models)
+            yield {'type': 'stage1_complete', 'data': stage1_results, 'metadata': {'included_models': included_models, 'pending_models': list(pending)}}
+        else:
+            stage1_results = stage1_task.result()
+            yield {'type': 'stage1_complete', 'data': stage1_results}
+
+        # Stage 2: Collect rankings, stragglers may still stream their stage 1 answer meanwhile
+        yield {'type': 'stage2_start'}
+        stage2_task = asyncio.create_task(council.stage2_collect_rankings(user_query, stage1_results, reviewers))
+        async for event in drain_events(deltas, stage2_task):
+            yield event
+        stage2_results, label_to_model = stage2_task.result()
+        aggregate_rankings = council.calculate_aggregate_rankings(stage2_results, label_to_model)
+        metadata = {'label_to_model': label_to_model, 'aggregate_rankings': aggregate_rankings}
+        yield {'type': 'stage2_complete', 'data': stage2_results, 'metadata': metadata}
+
+        # Late stage 1 answers go to the chairman without peer review
+        if pending:
+            late_task = asyncio.create_task(council.stage1_collect_stragglers(pending))
+            async for event in drain_events(deltas, late_task):
+                yield event
+            late_results = late_task.result()
+            stage1_results = stage1_results + late_results
+            yield {'type': 'stage1_late', 'data': late_results, 'metadata': {'late_models': [result['model'] for result in late_results]}}
+
+        # Stage 3: Synthesize final answer
+        yield {'type': 'stage3_start'}
+        stage3_task = asyncio.create_task(council.stage3_synthesize_final(
+            user_query,
+            stage1_results,
+            stage2_results,
+            on_delta=on_stage3_delta,
+            aggregate_rankings=aggregate_rankings
+        ))
+        async for event in drain_events(deltas, stage3_task):
+            yield event
+        stage3_result = stage3_task.result()
+        yield {'type': 'stage3_complete', 'data': stage3_result}
+
+        run["result"] = (stage1_results, stage2_results, stage3_result, metadata)
+
+    finally:
+        # Stragglers left running when the run stops early
+        for task in pending.values():
+            task.cancel()
+
+
+async def replay_cached_run(cached: Tuple[List, List, Dict, Dict], run: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield the stage events of a cached run, flagged as cached.
+
+    Args:
+        cached: The (stage1, stage2, stage3, metadata) tuple from the cache
+        run: Filled with the cached tuple under 'result'
+
+    Yields:
+        SSE events for the 3 stages
+    """
+    stage1_results, stage2_results, stage3_result, metadata = cached
+    metrics.record_run(stage3_result, cached=True)
+
+    yield {'type': 'stage1_complete', 'data': stage1_results, 'metadata': {'cached': True}}
+    yield {'type': 'stage2_complete', 'data': stage2_results, 'metadata': metadata}
+    yield {'type': 'stage3_complete', 'data': stage3_result, 'metadata': {'cached': True}}
+
+    run["result"] = cached
+
+
 @app.get("/")
 async def root():
-    """Health check endpoint."""
+    """Liveness endpoint, answers as soon as the API runs."""
     return {"status": "ok", "service": "LLM Council API"}
 
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness endpoint, 503 until the chairman and a councillor are provisioned.
+    Reports the state of every model, with the pull progress while provisioning.
+    """
+    stats = bootstrap.stats()
+    if not stats["ready"]:
+        return JSONResponse(status_code=503, content=stats)
+    return stats
+
+@app.get("/api/cache")
+async def cache_stats():
+    """Council run cache counters."""
+    if council.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **council.cache.stats()}
+
+
+def refresh_gauges() -> None:
+    """Set the gauges of the metrics from the scheduler, dispatchers and cache."""
+    queue = scheduler.stats()
+    metrics.QUEUE_RUNNING.set(queue["running"])
+    metrics.QUEUE_WAITING.set(queue["queued"])
+
+    for host, state in ollama.dispatcher_stats().items():
+        metrics.HOST_ACTIVE.set(sum(state["active"].values()), host=host)
+        metrics.HOST_WAITING.set(state["waiting"], host=host)
+
+    if council.cache is not None:
+        cache = council.cache.stats()
+        metrics.CACHE_HITS.set(cache["hits"])
+        metrics.CACHE_MISSES.set(cache["misses"])
+        metrics.CACHE_ENTRIES.set(cache["entries"])
+
+
+def worker_state() -> Dict[str, Any]:
+    """Get the metrics and status of this worker, as published to the other workers."""
+    refresh_gauges()
+
+    return {
+        "metrics": metrics.snapshot(),
+        "status": {**scheduler.stats(), "runs": run_registry.stats(), "ready": bootstrap.ready}
+    }
+
+
+async def read_worker_states() -> List[Dict[str, Any]]:
+    """Publish the up-to-date state of this worker, then read those of every live worker."""
+    await asyncio.to_thread(workers.publish, worker_state())
+    return await asyncio.to_thread(workers.read_states)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Prometheus metrics : ollama requests and token statistics, stage timings, queue, storage and cache.
+    With several workers, every series is summed over the live workers.
+    """
+    if workers.SHARED:
+        states = await read_worker_states()
+        text = metrics.render_combined([state["metrics"] for state in states])
+    else:
+        refresh_gauges()
+        text = metrics.render()
+
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/queue")
+async def queue_stats():
+    """
+    Council run scheduler counters, streamed runs, per-host dispatcher state and replica pools.
+    With several workers, the counters are summed over the live workers, detailed under 'workers',
+    the hosts and pools are those of the worker answering.
+    """
+    stats = {**scheduler.stats(), "runs": run_registry.stats()}
+
+    if workers.SHARED:
+        states = [{"pid": state["pid"], **state["status"]} for state in await read_worker_states()]
+        stats = {key: sum(state[key] for state in states) for key in scheduler.stats()}
+        stats["runs"] = {key: sum(state["runs"][key] for state in states) for key in run_registry.stats()}
+        stats["workers"] = states
+
+    return {**stats, "hosts": ollama.dispatcher_stats(), "pools": ollama.pool_stats()}
+
+
+def start_summary(conversation_id: str) -> None:
+    """Update the summary of a conversation in the background, once the answer of a turn is saved."""
+    task = asyncio.create_task(summarize_conversation(conversation_id))
+    summary_tasks.add(task)
+    task.add_done_callback(summary_tasks.discard)
+
+
+async def summarize_conversation(conversation_id: str) -> None:
+    """Fold the turns leaving the window of the last turns into the summary of a conversation."""
+    try:
+        conversation = await async_storage.get_conversation(conversation_id)
+        if conversation is None:
+            return
+
+        summary = await council.summarize(conversation)
+        if summary is not None:
+            await async_storage.update_conversation_summary(conversation_id, *summary)
+    except Exception:
+        # The next question condenses the turns without model instead
+        logger.exception("Conversation summary failed")
+
+
+def submit_run():
+    """
+    Request a council run slot from the scheduler.
+
+    Returns:
+        Ticket to wait on, then to release once the run is done
+
+    Raises:
+        HTTPException: 429 if the queue is full
+    """
+    try:
+        return scheduler.submit()
+    except QueueFullError as e:
+        raise queue_full(e)
+
+
+def queue_full(error: QueueFullError) -> HTTPException:
+    """Get the 429 answered when the scheduler queue is full."""
+    metrics.QUEUE_REJECTED.inc()
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": "30"})
+
+
 @app.get("/api/conversations", response_model=List[ConversationMetadata])
-async def list_conversations():
-    """List all conversations (metadata only)."""
-    return storage.list_conversations()
+async def list_conversations(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    before: Optional[str] = None
+):
+    """
+    List conversations (metadata only), newest first.
+    Page with `limit` and the `created_at` of the last item as `before`.
+    """
+    return await async_storage.list_conversations(limit=limit, before=before)
 
 
 @app.post("/api/conversations", response_model=Conversation)
 async def create_conversation(request: CreateConversationRequest):
     """Create a new conversation."""
     conversation_id = str(uuid.uuid4())
-    conversation = storage.create_conversation(conversation_id)
+    conversation = await async_storage.create_conversation(conversation_id)
     return conversation
 
 
 @app.get("/api/conversations/{conversation_id}", response_model=Conversation)
 async def get_conversation(conversation_id: str):
     """Get a specific conversation with all its messages."""
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await async_storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return conversation
@@ -88,7 +500,7 @@ async def get_conversation(conversation_id: str):
 @app.delete("/api/conversations/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """Delete a conversation."""
-    deleted = storage.delete_conversation(conversation_id)
+    deleted = await async_storage.delete_conversation(conversation_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return {"deleted": True}
@@ -101,37 +513,61 @@ async def send_message(conversation_id: str, request: SendMessageRequest):
     Returns the complete response with all stages.
     """
 
-    print("New conversation message")
+    logs.conversation_id.set(conversation_id)
+    logger.info("New conversation message", extra={"chars": len(request.content)})
 
     # Check if conversation exists
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await async_storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
     # Check if this is the first message
     is_first_message = len(conversation["messages"]) == 0
 
-    # Add user message
-    storage.add_user_message(conversation_id, request.content)
+    # Summary of the earlier turns and last turns, for the councillors
+    history = council.conversation_history(conversation)
 
-    # If this is the first message, generate a title
-    if is_first_message:
-        title = await council.generate_conversation_title(request.content)
-        storage.update_conversation_title(conversation_id, title)
+    # Wait for a council run slot, or reject right away if the queue is full
+    ticket = submit_run()
 
-    # Run the 3-stage council process
-    stage1_results, stage2_results, stage3_result, metadata = await council.run_full_council(
-        request.content
-    )
+    title_task = None
+
+    try:
+        await ticket.wait()
+
+        # Add user message
+        await async_storage.add_user_message(conversation_id, request.content)
+
+        # If this is the first message, name the conversation in the background
+        if is_first_message:
+            title_task = council.start_title(request.content)
+
+        # Run the 3-stage council process
+        stage1_results, stage2_results, stage3_result, metadata = await council.run_full_council(
+            request.content,
+            pipelined=PIPELINE_STAGE2 if request.pipelined is None else request.pipelined,
+            use_cache=request.use_cache,
+            history=history
+        )
+
+        if title_task:
+            await async_storage.update_conversation_title(conversation_id, await council.collect_title(title_task, request.content))
+    finally:
+        scheduler.release(ticket)
+
+        if title_task:
+            title_task.cancel()
 
     # Add assistant message with all stages
-    storage.add_assistant_message(
+    await async_storage.add_assistant_message(
         conversation_id,
         stage1_results,
         stage2_results,
         stage3_result
     )
 
+    start_summary(conversation_id)
+
     # Return the complete response with metadata
     return {
         "stage1": stage1_results,
@@ -141,69 +577,168 @@ async def send_message(conversation_id: str, request: SendMessageRequest):
     }
 
 
-@app.post("/api/conversations/{conversation_id}/message/stream")
-async def send_message_stream(conversation_id: str, request: SendMessageRequest):
+@app.post("/api/conversations/{conversation_id}/messages/{message_index}/rerun")
+async def rerun_message_stages(conversation_id: str, message_index: int, request: RerunStagesRequest):
     """
-    Send a message and stream the 3-stage council process.
-    Returns Server-Sent Events as each stage completes.
+    Re-run stage 2 and/or stage 3 of an assistant message from its saved stage 1.
+    The message is updated in place and the new stages are returned.
     """
-
-    print("New conversation message stream")
-
-    # Check if conversation exists
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await async_storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    # Check if this is the first message
-    is_first_message = len(conversation["messages"]) == 0
+    messages = conversation["messages"]
+    if not 0 < message_index < len(messages) or messages[message_index]["role"] != "assistant":
+        raise HTTPException(status_code=404, detail="Assistant message not found")
+
+    message = messages[message_index]
+    user_query = messages[message_index - 1]["content"]
+
+    if not message.get("stage1"):
+        raise HTTPException(status_code=400, detail="No stage 1 responses to re-run from")
+    if request.from_stage == 3 and not message.get("stage2"):
+        raise HTTPException(status_code=400, detail="No stage 2 rankings to re-synthesize from")
+
+    ticket = submit_run()
+
+    try:
+        await ticket.wait()
+
+        stage2_results, stage3_result, metadata = await council.rerun_stages(
+            user_query,
+            message["stage1"],
+            message.get("stage2"),
+            from_stage=request.from_stage
+        )
+    finally:
+        scheduler.release(ticket)
+
+    await async_storage.update_assistant_message(
+        conversation_id,
+        message_index,
+        message["stage1"],
+        stage2_results,
+        stage3_result
+    )
+
+    # The context of a later turn is not rebuilt here, only first questions are cached again
+    if council.conversation_history({"messages": messages[:message_index - 1]}) is None:
+        await council.cache_run(user_query, message["stage1"], stage2_results, stage3_result, metadata)
+
+    return {
+        "stage1": message["stage1"],
+        "stage2": stage2_results,
+        "stage3": stage3_result,
+        "metadata": metadata
+    }
+
+
+async def council_run_events(
+    conversation_id: str,
+    request: SendMessageRequest,
+    is_first_message: bool,
+    pipelined: bool,
+    history: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the council on a message and save the answer, yielding the events of a streamed run.
+
+    Consumed by the run registry, the run goes on if the client disconnects.
+
+    Args:
+        conversation_id: Conversation the message is sent in
+        request: The message
+        is_first_message: Name the conversation too
+        pipelined: Start stage 2 on a stage 1 quorum
+        history: Context of the conversation for the councillors, None for a first question
+
+    Yields:
+        Events of the run, up to 'complete' or 'error'
+    """
+    ticket = None
+    title_task = None
+    try:
+        # Wait for a council run slot, reporting the queue position meanwhile
+        ticket = scheduler.submit()
+        async for position in ticket.positions():
+            yield {'type': 'queued', 'position': position}
+
+        # Add user message
+        await async_storage.add_user_message(conversation_id, request.content)
+
+        # Name the conversation in the background, it never delays the council
+        if is_first_message:
+            title_task = council.start_title(request.content)
+
+        # Identical questions are replayed from the cache
+        cached = await council.get_cached_run(request.content, history) if request.use_cache else None
+
+        run = {}
+        if cached is not None:
+            events = replay_cached_run(cached, run)
+        else:
+            events = stream_council_run(request.content, pipelined, run, history)
+
+        async for event in events:
+            yield event
+
+        stage1_results, stage2_results, stage3_result, metadata = run["result"]
+
+        if cached is None:
+            await council.cache_run(request.content, stage1_results, stage2_results, stage3_result, metadata, history)
+
+        # Use the generated title if ready, an extracted one otherwise
+        if title_task:
+            title = await council.collect_title(title_task, request.content)
+            await async_storage.update_conversation_title(conversation_id, title)
+            yield {'type': 'title_complete', 'data': {'title': title}}
+
+        # Save complete assistant message
+        await async_storage.add_assistant_message(
+            conversation_id,
+            stage1_results,
+            stage2_results,
+            stage3_result
+        )
+
+        start_summary(conversation_id)
+
+        # Send completion event, with the timings of the run
+        yield {'type': 'complete', 'metadata': {'metrics': metadata.get('metrics')}}
+
+    except QueueFullError as e:
+        # The queue filled up since start_message_run checked it
+        metrics.QUEUE_REJECTED.inc()
+        yield {'type': 'error', 'message': str(e)}
+
+    except Exception as e:
+        logger.exception("Council run stream failed")
+
+        # Send error event
+        yield {'type': 'error', 'message': str(e)}
+
+    finally:
+        scheduler.release(ticket)
+
+        # Run failed or cancelled, the title is not needed anymore
+        if title_task:
+            title_task.cancel()
+
 
+def stream_run(run: CouncilRun, after: int = 0) -> StreamingResponse:
+    """
+    Stream the events of a run after a sequence number, each with a 'run_id:seq' SSE id.
+
+    Args:
+        run: Run to follow
+        after: Sequence number of the last event the client got, 0 for all
+
+    Returns:
+        Server-Sent Events response, ending with the run
+    """
     async def event_generator():
-        try:
-            # Add user message
-            storage.add_user_message(conversation_id, request.content)
-
-            # Start title generation in parallel (don't await yet)
-            title_task = None
-            if is_first_message:
-                title_task = asyncio.create_task(council.generate_conversation_title(request.content))
-
-            # Stage 1: Collect responses
-            yield f"data: {json.dumps({'type': 'stage1_start'})}\n\n"
-            stage1_results = await council.stage1_collect_responses(request.content)
-            yield f"data: {json.dumps({'type': 'stage1_complete', 'data': stage1_results})}\n\n"
-
-            # Stage 2: Collect rankings
-            yield f"data: {json.dumps({'type': 'stage2_start'})}\n\n"
-            stage2_results, label_to_model = await council.stage2_collect_rankings(request.content, stage1_results)
-            aggregate_rankings = council.calculate_aggregate_rankings(stage2_results, label_to_model)
-            yield f"data: {json.dumps({'type': 'stage2_complete', 'data': stage2_results, 'metadata': {'label_to_model': label_to_model, 'aggregate_rankings': aggregate_rankings}})}\n\n"
-
-            # Stage 3: Synthesize final answer
-            yield f"data: {json.dumps({'type': 'stage3_start'})}\n\n"
-            stage3_result = await council.stage3_synthesize_final(request.content, stage1_results, stage2_results)
-            yield f"data: {json.dumps({'type': 'stage3_complete', 'data': stage3_result})}\n\n"
-
-            # Wait for title generation if it was started
-            if title_task:
-                title = await title_task
-                storage.update_conversation_title(conversation_id, title)
-                yield f"data: {json.dumps({'type': 'title_complete', 'data': {'title': title}})}\n\n"
-
-            # Save complete assistant message
-            storage.add_assistant_message(
-                conversation_id,
-                stage1_results,
-                stage2_results,
-                stage3_result
-            )
-
-            # Send completion event
-            yield f"data: {json.dumps({'type': 'complete'})}\n\n"
-
-        except Exception as e:
-            # Send error event
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+        async for seq, event in run.follow(after):
+            yield f"id: {run.id}:{seq}\n" + sse_event(event)
 
     return StreamingResponse(
         event_generator(),
@@ -211,13 +746,153 @@ async def send_message_stream(conversation_id: str, request: SendMessageRequest)
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
+            "X-Run-ID": run.id
         }
     )
 
 
+@app.post("/api/conversations/{conversation_id}/message/stream")
+async def send_message_stream(
+    conversation_id: str,
+    request: SendMessageRequest,
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Send a message and stream the 3-stage council process.
+    Returns Server-Sent Events as each stage completes.
+
+    The run does not depend on the connection : sending the same request
+    again with the Last-Event-ID header replays the missed events and
+    follows the run, as does sending it again while the run is in progress.
+    """
+
+    logs.conversation_id.set(conversation_id)
+
+    # Reconnection to a run of this conversation
+    resumed = runs.parse_event_id(last_event_id)
+    if resumed is not None:
+        run = run_registry.get(resumed[0])
+        if run is not None and run.conversation_id == conversation_id:
+            logger.info("Resumed council run stream", extra={"run_id": run.id, "after": resumed[1]})
+            return stream_run(run, resumed[1])
+
+        # Starting the run again would answer the question twice
+        if run is None and run_registry.snapshot(resumed[0]) is not None:
+            raise_other_worker(resumed[0])
+
+    # Retry of a request whose run is still in progress
+    run = run_registry.active(conversation_id, request.content)
+    if run is not None:
+        logger.info("Attached to council run in progress", extra={"run_id": run.id})
+        return stream_run(run)
+
+    logger.info("New conversation message stream", extra={"chars": len(request.content)})
+
+    return stream_run(await start_message_run(conversation_id, request))
+
+
+def raise_other_worker(run_id: str):
+    """
+    Refuse to stream a run of another worker, its events are only buffered there.
+
+    Raises:
+        HTTPException: 409, pointing to the job snapshot any worker serves
+    """
+    raise HTTPException(
+        status_code=409,
+        detail=f"Run {run_id} is served by another worker, poll /api/jobs/{run_id} for its results",
+        headers={"Location": f"/api/jobs/{run_id}"}
+    )
+
+
+async def start_message_run(conversation_id: str, request: SendMessageRequest) -> CouncilRun:
+    """
+    Start a council run on a message in the background.
+
+    Raises:
+        HTTPException: 404 if the conversation does not exist, 429 if the queue is full
+    """
+    # Check if conversation exists
+    conversation = await async_storage.get_conversation(conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    # Check if this is the first message
+    is_first_message = len(conversation["messages"]) == 0
+
+    pipelined = PIPELINE_STAGE2 if request.pipelined is None else request.pipelined
+
+    # Reject right away if the queue is full, the slot itself is taken by the run
+    if scheduler.is_full():
+        raise queue_full(scheduler.reject())
+
+    return run_registry.start(
+        conversation_id,
+        request.content,
+        council_run_events(conversation_id, request, is_first_message, pipelined, council.conversation_history(conversation))
+    )
+
+
+@app.post("/api/conversations/{conversation_id}/jobs", status_code=202)
+async def submit_message_job(conversation_id: str, request: SendMessageRequest):
+    """
+    Send a message as a background job, answered right away with the job id.
+    The council runs once a slot is free ; poll GET /api/jobs/{job_id} for the
+    stage results as they complete, or follow GET /api/jobs/{job_id}/events.
+    """
+    logs.conversation_id.set(conversation_id)
+    # A retry of a job in progress gets the same job
+    run = run_registry.active(conversation_id, request.content)
+    if run is None:
+        logger.info("New conversation message job", extra={"chars": len(request.content)})
+        run = await start_message_run(conversation_id, request)
+
+    return JSONResponse(status_code=202, content=run.snapshot(), headers={"Location": f"/api/jobs/{run.id}"})
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """State of a job (queued, running, complete, failed or cancelled) and the results of its stages so far."""
+    snapshot = run_registry.snapshot(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return snapshot
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a job, its requests to the models are stopped and nothing more is saved."""
+    snapshot = await run_registry.cancel(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return snapshot
+
+
+@app.get("/api/runs/{run_id}/events")
+@app.get("/api/jobs/{run_id}/events")
+async def follow_run(
+    run_id: str,
+    after: int = Query(0, ge=0),
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Follow a streamed run, e.g. with an EventSource after a disconnect.
+    Replays the events after the Last-Event-ID header, or the `after` sequence number.
+    """
+    run = run_registry.get(run_id)
+    if run is None:
+        if run_registry.snapshot(run_id) is not None:
+            raise_other_worker(run_id)
+        raise HTTPException(status_code=404, detail="Run not found or expired")
+
+    resumed = runs.parse_event_id(last_event_id)
+    if resumed is not None and resumed[0] == run_id:
+        after = resumed[1]
+
+    return stream_run(run, after)
+
+
 if __name__ == "__main__":
 
-    council = Council()
-    
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    uvicorn.run("main:app", host="0.0.0.0", port=8001, workers=API_WORKERS)
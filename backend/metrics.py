@@ -0,0 +1,371 @@
+"""Instrumentation of the council : Prometheus-style metrics and per-run timings."""
+
+import contextvars
+import functools
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Bucket upper bounds in seconds, from a storage write to a slow chairman synthesis
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Bucket upper bounds in tokens, for prompt sizes
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+LabelValues = Tuple[str, ...]
+
+
+class Metric(ABC):
+    """Base of the metrics, one value or series per set of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+
+        self.name = name
+        self.description = description
+        self.labels = labels
+
+        REGISTRY.append(self)
+
+    def label_values(self, labels: Dict[str, Any]) -> LabelValues:
+        """Order the label values as declared."""
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def format_labels(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        """Format the labels of a sample, e.g. {model="gemma3:1b"}."""
+        pairs = list(zip(self.labels, values)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    @abstractmethod
+    def dump(self) -> List[List[Any]]:
+        """Get the values of the metric as JSON-serializable rows, one per set of label values."""
+
+    @abstractmethod
+    def combine(self, dumps: List[List[List[Any]]]) -> Dict[LabelValues, Any]:
+        """Add up the values dumped by several processes, by label values."""
+
+    @abstractmethod
+    def samples(self, values: Optional[Dict[LabelValues, Any]] = None) -> List[str]:
+        """Get the sample lines of the metric, from its own values or combined ones."""
+
+    def render(self, values: Optional[Dict[LabelValues, Any]] = None) -> str:
+        """Get the metric in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples(values))
+
+
+class Counter(Metric):
+    """Value that only goes up."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, description, labels)
+        self.values : Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self.label_values(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dump(self) -> List[List[Any]]:
+        return [[list(key), value] for key, value in self.values.items()]
+
+    def combine(self, dumps: List[List[List[Any]]]) -> Dict[LabelValues, Any]:
+        return combine_values(dumps)
+
+    def samples(self, values: Optional[Dict[LabelValues, Any]] = None) -> List[str]:
+        values = self.values if values is None else values
+        return [f"{self.name}{self.format_labels(key)} {value}" for key, value in values.items()]
+
+
+class Gauge(Metric):
+    """Value that goes up and down, usually set when scraped."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, description, labels)
+        self.values : Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        self.values[self.label_values(labels)] = value
+
+    def dump(self) -> List[List[Any]]:
+        return [[list(key), value] for key, value in self.values.items()]
+
+    def combine(self, dumps: List[List[List[Any]]]) -> Dict[LabelValues, Any]:
+        # Runs, requests and cache entries of every worker add up
+        return combine_values(dumps)
+
+    def samples(self, values: Optional[Dict[LabelValues, Any]] = None) -> List[str]:
+        values = self.values if values is None else values
+        return [f"{self.name}{self.format_labels(key)} {value}" for key, value in values.items()]
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+
+        # Counts by bucket, sum and count, by label values
+        self.series : Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.label_values(labels)
+        counts, totals = self.series.setdefault(key, ([0] * len(self.buckets), [0.0, 0.0]))
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+
+        totals[0] += value
+        totals[1] += 1
+
+    def dump(self) -> List[List[Any]]:
+        return [[list(key), counts, totals] for key, (counts, totals) in self.series.items()]
+
+    def combine(self, dumps: List[List[List[Any]]]) -> Dict[LabelValues, Any]:
+        series = {}
+
+        for rows in dumps:
+            for key, counts, totals in rows:
+                merged_counts, merged_totals = series.setdefault(tuple(key), ([0] * len(self.buckets), [0.0, 0.0]))
+                for i, bucket_count in enumerate(counts):
+                    merged_counts[i] += bucket_count
+                merged_totals[0] += totals[0]
+                merged_totals[1] += totals[1]
+
+        return series
+
+    def samples(self, values: Optional[Dict[LabelValues, Any]] = None) -> List[str]:
+        lines = []
+        series = self.series if values is None else values
+
+        for key, (counts, (total, count)) in series.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{self.format_labels(key, ('le', str(bound)))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{self.format_labels(key, ('le', '+Inf'))} {int(count)}")
+            lines.append(f"{self.name}_sum{self.format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self.format_labels(key)} {int(count)}")
+
+        return lines
+
+
+REGISTRY : List[Metric] = []
+
+# Ollama requests, one observation per attempt
+OLLAMA_REQUEST_SECONDS = Histogram("council_ollama_request_seconds", "Duration of the requests to ollama", ("model", "host", "outcome"))
+OLLAMA_EVAL_TOKENS = Counter("council_ollama_eval_tokens_total", "Tokens generated by ollama (eval_count)", ("model",))
+OLLAMA_PROMPT_TOKENS = Counter("council_ollama_prompt_tokens_total", "Prompt tokens evaluated by ollama (prompt_eval_count)", ("model",))
+OLLAMA_EVAL_SECONDS = Counter("council_ollama_eval_seconds_total", "Time spent generating tokens (eval_duration)", ("model",))
+OLLAMA_PROMPT_EVAL_SECONDS = Counter("council_ollama_prompt_eval_seconds_total", "Time spent evaluating prompts (prompt_eval_duration)", ("model",))
+OLLAMA_LOAD_SECONDS = Counter("council_ollama_load_seconds_total", "Time spent loading models (load_duration)", ("model",))
+
+# Council runs
+STAGE_SECONDS = Histogram("council_stage_seconds", "Wall time of the council stages", ("stage",))
+RUNS = Counter("council_runs_total", "Council runs by outcome", ("outcome",))
+QUEUE_REJECTED = Counter("council_queue_rejected_total", "Council runs rejected because the queue was full")
+PROMPT_TOKENS = Histogram("council_prompt_tokens", "Estimated tokens of the stage 2 and 3 prompts", ("stage",), TOKEN_BUCKETS)
+PROMPT_TRUNCATIONS = Counter("council_prompt_truncations_total", "Answers and critiques cut to fit the prompt budget", ("stage",))
+
+# Storage operations of the API
+STORAGE_SECONDS = Histogram("council_storage_seconds", "Duration of the storage operations", ("operation",))
+
+# Set when scraped, from the scheduler, dispatchers and cache
+QUEUE_RUNNING = Gauge("council_queue_running", "Council runs in progress")
+QUEUE_WAITING = Gauge("council_queue_waiting", "Council runs waiting for a slot")
+HOST_ACTIVE = Gauge("council_host_active_requests", "Requests in flight on an ollama host", ("host",))
+HOST_WAITING = Gauge("council_host_waiting_requests", "Requests waiting for a slot on an ollama host", ("host",))
+CACHE_HITS = Gauge("council_cache_hits", "Council runs answered from the cache since startup")
+CACHE_MISSES = Gauge("council_cache_misses", "Council runs not found in the cache since startup")
+CACHE_ENTRIES = Gauge("council_cache_entries", "Council runs held in the cache")
+
+
+def render() -> str:
+    """Get every metric in the Prometheus text format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def snapshot() -> Dict[str, List[List[Any]]]:
+    """Get the values of every metric, to be combined with those of the other workers."""
+    return {metric.name: metric.dump() for metric in REGISTRY}
+
+
+def render_combined(snapshots: List[Dict[str, List[List[Any]]]]) -> str:
+    """
+    Get every metric in the Prometheus text format, added up over several worker processes.
+
+    Args:
+        snapshots: Metric values of each worker, as taken by snapshot()
+
+    Returns:
+        Metrics text, each series summed over the workers
+    """
+    return "\n".join(
+        metric.render(metric.combine([worker.get(metric.name, []) for worker in snapshots]))
+        for metric in REGISTRY
+    ) + "\n"
+
+
+def combine_values(dumps: List[List[List[Any]]]) -> Dict[LabelValues, float]:
+    """Sum dumped counter or gauge rows by label values."""
+    values : Dict[LabelValues, float] = {}
+
+    for rows in dumps:
+        for key, value in rows:
+            values[tuple(key)] = values.get(tuple(key), 0.0) + value
+
+    return values
+
+
+class RunMetrics():
+    """Timings of one council run : wall time of each stage, every ollama request and the prompt sizes."""
+
+    def __init__(self):
+
+        self.started = time.monotonic()
+        self.stages : Dict[str, float] = {}
+        self.requests : List[Dict[str, Any]] = []
+        self.prompts : Dict[str, Dict[str, Any]] = {}
+
+    def summary(self) -> Dict[str, Any]:
+        """Get the timings, as attached to the run metadata."""
+        return {
+            "total": round(time.monotonic() - self.started, 3),
+            "stages": {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+            "requests": self.requests,
+            "prompts": self.prompts
+        }
+
+
+# Run and stage of the running task, inherited by the tasks it creates
+_current_run : contextvars.ContextVar[Optional[RunMetrics]] = contextvars.ContextVar("current_run", default=None)
+_current_stage : contextvars.ContextVar[str] = contextvars.ContextVar("current_stage", default="")
+
+
+@contextmanager
+def collect_run() -> Iterator[RunMetrics]:
+    """Collect the timings of the council run made within the context."""
+    run = RunMetrics()
+    token = _current_run.set(run)
+
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a council stage, the ollama requests made within are attributed to it."""
+    token = _current_stage.set(name)
+    started = time.monotonic()
+
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started
+        _current_stage.reset(token)
+
+        STAGE_SECONDS.observe(elapsed, stage=name)
+
+        run = _current_run.get()
+        if run is not None:
+            run.stages[name] = run.stages.get(name, 0.0) + elapsed
+
+
+def timed_stage(name: str) -> Callable:
+    """Decorate a coroutine function running a council stage, to time it as `name`."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with stage(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_run(stage3_result: Dict[str, Any], cached: bool = False) -> None:
+    """Count a finished council run by outcome : 'cached', 'error' or 'success'."""
+    RUNS.inc(outcome="cached" if cached else "error" if stage3_result.get("error") else "success")
+
+
+def record_request(model: str, host: str, seconds: float, outcome: str, stats: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Record an ollama request, and the statistics ollama returned with its answer.
+
+    Args:
+        model: Name of the model queried
+        host: Host queried
+        seconds: Duration of the request
+        outcome: 'success' or 'failure'
+        stats: Final ollama chunk, with eval_count and the durations in nanoseconds
+    """
+    OLLAMA_REQUEST_SECONDS.observe(seconds, model=model, host=host, outcome=outcome)
+
+    usage = ollama_usage(stats or {})
+
+    OLLAMA_EVAL_TOKENS.inc(usage["eval_count"], model=model)
+    OLLAMA_PROMPT_TOKENS.inc(usage["prompt_eval_count"], model=model)
+    OLLAMA_EVAL_SECONDS.inc(usage["eval_duration"], model=model)
+    OLLAMA_PROMPT_EVAL_SECONDS.inc(usage["prompt_eval_duration"], model=model)
+    OLLAMA_LOAD_SECONDS.inc(usage["load_duration"], model=model)
+
+    run = _current_run.get()
+    if run is not None:
+        run.requests.append({
+            "model": model,
+            "host": host,
+            "stage": _current_stage.get(),
+            "outcome": outcome,
+            "seconds": round(seconds, 3),
+            **usage
+        })
+
+
+def record_prompt(stage: str, size: Dict[str, Any], responses: Dict[str, Optional[Dict[str, Any]]]) -> None:
+    """
+    Record the size of a stage prompt, with the prompt tokens ollama counted for each model.
+
+    Args:
+        stage: Stage of the prompt, e.g. 'stage2'
+        size: Estimated size of the prompt, as built by budget.prompt_size
+        responses: Answers to the prompt by model name, None for the failed ones
+    """
+    PROMPT_TOKENS.observe(size["estimated_tokens"], stage=stage)
+    PROMPT_TRUNCATIONS.inc(size["truncated"], stage=stage)
+
+    run = _current_run.get()
+    if run is not None:
+        run.prompts[stage] = {
+            **size,
+            "prompt_eval_count": {
+                model: response["usage"]["prompt_eval_count"]
+                for model, response in responses.items()
+                if response and response.get("usage")
+            }
+        }
+
+
+def ollama_usage(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the token counts and durations (in seconds) of an ollama answer, with the generation speed."""
+    usage = {
+        "eval_count": stats.get("eval_count", 0),
+        "prompt_eval_count": stats.get("prompt_eval_count", 0),
+        "eval_duration": round(stats.get("eval_duration", 0) / 1e9, 4),
+        "prompt_eval_duration": round(stats.get("prompt_eval_duration", 0) / 1e9, 4),
+        "load_duration": round(stats.get("load_duration", 0) / 1e9, 4)
+    }
+
+    usage["tokens_per_second"] = round(usage["eval_count"] / usage["eval_duration"], 2) if usage["eval_duration"] else None
+
+    return usage
@@ -3,6 +3,11 @@ import requests
 import textwrap
 import re
 import json
+import logging
+from typing import List
+
+# Stdlib logger, config imports this module before the logging setup exists
+logger = logging.getLogger("council.models")
 
 IP_REGEX = r"^([0-9a-z\-]+[.]?)+([0-9a-z\-]+)?$"
 
@@ -10,6 +15,7 @@ class Role(Enum) :
     CHAIRMAN = 0
     COUNCILOR = 1
     USER = 2
+    TITLE = 3 # Background model naming the conversations
 
 class ModelType(Enum):
     DEFAULT= 0
@@ -31,12 +37,26 @@ class CouncilModel() :
         model_name : str = "model", 
         role : int = Role.COUNCILOR,
         prompt : str | None = None,
-        custom_name : str | None = None):
+        custom_name : str | None = None,
+        num_parallel : int = 1,
+        max_loaded_models : int = 1,
+        timeout : float = 180.0,
+        replicas : List[str] | None = None):
 
         # Connection settings
         self.ip : str = ip
         self.port : int = port
 
+        # Host budget, as configured on the ollama instance
+        self.num_parallel : int = num_parallel # OLLAMA_NUM_PARALLEL, concurrent requests per loaded model
+        self.max_loaded_models : int = max_loaded_models # OLLAMA_MAX_LOADED_MODELS, models kept in memory
+
+        # Other ollama hosts ('ip:port') serving the same model, for retries and hedged requests
+        self.replicas : List[str] = list(replicas or [])
+
+        # Timeout of one request to the model, in seconds
+        self.timeout : float = timeout
+
         if not re.search(IP_REGEX, self.ip) :
             raise SyntaxError(f"Invalid IP format : {self.ip} !")
 
@@ -45,74 +65,23 @@ class CouncilModel() :
         self.model_name : str = model_name
         self.model_role : int = role
 
-        # Pull base model
-        self.pull()
-
-        # Load propt if applicable
+        # Load propt if applicable, the model is pulled and created by the bootstrap at startup
         self.model_type : int = ModelType.DEFAULT
         self.prompt : str | None = prompt
 
         if prompt and custom_name:
             self.model_type = ModelType.CUSTOM # Change model type
             self.model_name = custom_name # Update name of custom model
-            self.create() # Create new model from base model
 
         # Identifier
         self.id = self.count
         self.count += 1            
 
         # Display object summary
-        print(self)
+        logger.debug(str(self))
 
     # def status(self) -> dict :
 
-    def pull(self) -> None:
-        """Pull model from attributes"""
-
-        print(f"Pulling model for {self.host}")
-
-        url = f"http://{self.host}/api/pull"
-        
-        payload = {
-            "model" : self.base_model
-        }
-
-        try :
-            req = requests.post(url, json=payload)
-            req.raise_for_status()
-
-            print(f"Successfully pulled model : {self.model_name} for {self.host}")
-        
-        except (requests.HTTPError, requests.exceptions.ConnectionError) as e :
-            print(f"Failed to pull the model : {e}")
-
-    def create(self) -> None:
-        """Create new model from system prompt."""
-
-        print(f"Creating new model for {self.host}")
-
-        if not self.prompt :
-            print("Cannot create cutsom model without prompt !")
-            return
-
-        url = f"http://{self.host}/api/create"
-        
-        payload = {
-            "model" : self.model_name,
-            "from" : self.base_model,
-            "system" : self.prompt
-        }
-
-        try :
-            req = requests.post(url, json=payload)
-            req.raise_for_status()
-
-            print(f"Successfully created model : {self.model_name} from {self.base_model} for {self.host} : {req}")
-        
-        except (requests.HTTPError, requests.exceptions.ConnectionError) as e :
-            print(f"Failed to create the model : {e}")
-
-
     def fetch_available_models(self) -> dict:
         """Fetch available models from ollama host."""
 
@@ -126,10 +95,10 @@ class CouncilModel() :
 
             models = req.json()
 
-            print(models)
+            logger.debug("Fetched available models", extra={"host": self.host, "models": len(models.get("models", []))})
 
         except (requests.HTTPError, requests.exceptions.ConnectionError) as e :
-            print(f"Failed to fetch availbale models from {self.host} : {e}")
+            logger.warning("Failed to fetch available models", extra={"host": self.host, "error": str(e)})
         
         return models
 
@@ -142,12 +111,17 @@ class CouncilModel() :
 
         req = requests.get(url)
 
-        print(req)
+        logger.debug("Healthcheck", extra={"host": self.host, "status": req.status_code})
 
     @property
     def host(self) -> str :
         return f"{self.ip}:{self.port}"
 
+    @property
+    def hosts(self) -> List[str] :
+        """Every host serving the model, main host first."""
+        return list(dict.fromkeys([self.host] + self.replicas))
+
     def __str__(self) -> str:
         """Description of CouncilModel."""
 
@@ -156,6 +130,9 @@ class CouncilModel() :
         - Role : {"CHAIRMAIN" if self.model_role == Role.CHAIRMAN else "COUNCILOR"}
         - Base model : {self.base_model}
         - Host : {self.ip}:{self.port}
+        - Replicas : {", ".join(self.replicas) or "none"}
+        - Timeout : {self.timeout}s
+        - Host budget : {self.max_loaded_models} loaded model(s), {self.num_parallel} request(s) each
         - Custom prompt : {self.prompt is not None}
         """)
 
@@ -1,73 +1,459 @@
 """Ollama API client for making LLM requests to distributed Ollama instances."""
 
 import httpx
-from typing import List, Dict, Any, Optional
+from typing import AsyncContextManager, AsyncIterator, Callable, Iterable, List, Dict, Any, Optional, Set
 import asyncio
+import contextlib
+import json
+import logging
+import time
 
-from models import CouncilModel
+import metrics
+import logs
+from models import CouncilModel, Role
+from dispatcher import HostDispatcher
+from balancer import ReplicaPool
+from resilience import CircuitBreaker, HostUnavailableError, LatencyTracker, backoff_delay, is_host_failure, is_retryable
+from config import OLLAMA_MAX_CONNECTIONS, OLLAMA_MAX_KEEPALIVE, OLLAMA_KEEPALIVE_EXPIRY, OLLAMA_KEEP_ALIVE
+from config import OLLAMA_RETRIES, OLLAMA_RETRY_BACKOFF, OLLAMA_RETRY_BACKOFF_MAX, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN
+from config import HEDGE_ENABLED, HEDGE_PERCENTILE, HEDGE_DELAY, LOAD_BALANCING
+
+logger = logs.get_logger("ollama")
+
+# Callback receiving (model_name, text_delta) for each streamed chunk
+DeltaCallback = Callable[[str, str], None]
+
+# One long-lived client per Ollama host, shared by every request to that host
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+# Request dispatcher per Ollama host, hosts without dispatcher are not throttled
+_dispatchers: Dict[str, HostDispatcher] = {}
+
+# Circuit breaker per Ollama host, and latencies of successful requests per model
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies = LatencyTracker()
+
+# Pool of the hosts serving each model, by model name
+_pools: Dict[str, ReplicaPool] = {}
+
+
+def get_client(host: str) -> httpx.AsyncClient:
+    """
+    Get the pooled client for an Ollama host, creating it on first use.
+
+    Args:
+        host: Host in the 'ip:port' format
+
+    Returns:
+        AsyncClient with keep-alive connections bound to the host
+    """
+    client = _clients.get(host)
+
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=f"http://{host}",
+            http1=True,
+            limits=httpx.Limits(
+                max_connections=OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+                keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY
+            ),
+            headers={"Content-Type": "application/json"}
+        )
+        _clients[host] = client
+
+    return client
+
+
+def configure_hosts(models: Iterable[CouncilModel]) -> None:
+    """
+    Create the dispatcher of every host, from the budget set on its models, and the pool of every model.
+
+    Args:
+        models: CouncilModel instances of the council
+    """
+    _dispatchers.clear()
+    _pools.clear()
+
+    for model in models:
+        _pools[model.model_name] = ReplicaPool(model.hosts, LOAD_BALANCING)
+
+        for host in model.hosts:
+            dispatcher = _dispatchers.get(host)
+
+            # Models of a host share its budget, keep the most conservative one
+            if dispatcher is None or (model.max_loaded_models, model.num_parallel) < (dispatcher.max_loaded, dispatcher.num_parallel):
+                _dispatchers[host] = HostDispatcher(model.max_loaded_models, model.num_parallel)
+
+
+def model_slot(model: CouncilModel, host: Optional[str] = None) -> AsyncContextManager:
+    """Get the context holding a request slot for a model on a host, its main host by default."""
+    dispatcher = _dispatchers.get(host or model.host)
+    if dispatcher is None:
+        return contextlib.nullcontext()
+
+    # Titles wait for the council requests of the host
+    return dispatcher.slot(model.model_name, background=model.model_role == Role.TITLE)
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    """Get the circuit breaker of a host, creating it on first use."""
+    if host not in _breakers:
+        _breakers[host] = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN)
+    return _breakers[host]
+
+
+def get_pool(model: CouncilModel) -> ReplicaPool:
+    """Get the pool of hosts serving a model, creating it on first use."""
+    if model.model_name not in _pools:
+        _pools[model.model_name] = ReplicaPool(model.hosts, LOAD_BALANCING)
+    return _pools[model.model_name]
+
+
+def available_hosts(model: CouncilModel) -> List[str]:
+    """Get the healthy hosts serving a model whose circuit is not open, best first."""
+    return [host for host in get_pool(model).order() if get_breaker(host).allow()]
+
+
+def pick_host(model: CouncilModel, tried: Set[str]) -> str:
+    """
+    Pick the host to send a request for a model to.
+
+    Args:
+        model: CouncilModel instance to query
+        tried: Hosts already tried by the request, used only when no other host is available
+
+    Returns:
+        Best available host
+
+    Raises:
+        HostUnavailableError: If every host of the model is down
+    """
+    hosts = available_hosts(model)
+
+    if not hosts:
+        raise HostUnavailableError(f"every host of {model.model_name} is down")
+
+    return next((host for host in hosts if host not in tried), hosts[0])
+
+
+def set_host_health(model: CouncilModel, host: str, healthy: bool) -> None:
+    """Eject a host from the pool of a model, or readmit it."""
+    get_pool(model).set_healthy(host, healthy)
+
+
+def dispatcher_stats() -> Dict[str, Dict[str, Any]]:
+    """Get the dispatcher and circuit state of every host."""
+    return {
+        host: {**dispatcher.stats(), "circuit": get_breaker(host).state}
+        for host, dispatcher in _dispatchers.items()
+    }
+
+
+def pool_stats() -> Dict[str, Dict[str, Dict[str, object]]]:
+    """Get the routing state of the hosts of every model."""
+    return {name: pool.stats() for name, pool in _pools.items()}
+
+
+def open_clients(models: Iterable[CouncilModel]) -> None:
+    """
+    Create the pooled clients for every host used by the given models.
+
+    Args:
+        models: CouncilModel instances to open connections for
+    """
+    for model in models:
+        for host in model.hosts:
+            get_client(host)
+
+
+async def close_clients() -> None:
+    """Close every pooled client and release their connections."""
+    clients = list(_clients.values())
+    _clients.clear()
+
+    await asyncio.gather(*(client.aclose() for client in clients))
+
+
+async def stream_chat(
+    model: CouncilModel,
+    messages: List[Dict[str, str]],
+    timeout: float = 180.0,
+    host: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a chat completion from an Ollama instance.
+
+    Ollama answers with one JSON object per line (NDJSON), the last one
+    having 'done' set to True.
+
+    Args:
+        model: CouncilModel instance with connection details
+        messages: List of message dictionaries with 'role' and 'content'
+        timeout: Maximum wait in seconds between two chunks
+        host: Host to query, the main host of the model by default
+
+    Yields:
+        Decoded NDJSON chunks as dictionaries
+
+    Raises:
+        httpx.HTTPError: If the request fails or the host is unreachable
+    """
+    payload = {
+        "model": model.model_name,
+        "messages": messages,
+        "stream": True,
+        "keep_alive": OLLAMA_KEEP_ALIVE
+    }
+
+    host = host or model.host
+    client = get_client(host)
+
+    async with model_slot(model, host):
+        async with client.stream("POST", "/api/chat", json=payload, timeout=timeout) as response:
+            response.raise_for_status()
+
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+
+                chunk = json.loads(line)
+
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+
+                yield chunk
+
+
+async def chat_attempt(
+    model: CouncilModel,
+    messages: List[Dict[str, str]],
+    timeout: float,
+    on_delta: Optional[DeltaCallback] = None,
+    tried: Optional[Set[str]] = None
+) -> Dict[str, Any]:
+    """
+    Send one chat request to the best host of the model, recording whether the host answered on its circuit breaker.
+
+    The host is picked when the attempt starts, so that concurrent attempts
+    see the requests already in flight.
+
+    Args:
+        model: CouncilModel instance to query
+        messages: List of message dictionaries with 'role' and 'content'
+        timeout: Request timeout in seconds
+        on_delta: Optional callback receiving (model_name, delta) while streaming
+        tried: Hosts already tried by the request, avoided when possible, the picked host is added
+
+    Returns:
+        Dictionary with 'content' and 'reasoning_details'
+
+    Raises:
+        HostUnavailableError: If every host of the model is down
+        Exception: Any error from the request
+    """
+    host = pick_host(model, tried or set())
+    if tried is not None:
+        tried.add(host)
+
+    breaker = get_breaker(host)
+    started = time.monotonic()
+
+    try:
+        with get_pool(model).track(host):
+            if on_delta is not None:
+                parts = []
+                stats = {}
+
+                async for chunk in stream_chat(model, messages, timeout, host):
+                    delta = chunk.get('message', {}).get('content', '')
+                    if delta:
+                        parts.append(delta)
+                        on_delta(model.model_name, delta)
+
+                    # The last chunk carries the statistics of the generation
+                    stats = chunk
+
+                content = "".join(parts)
+
+            else:
+                payload = {
+                    "model": model.model_name,
+                    "messages": messages,
+                    "stream": False,  # Disable streaming to get complete response
+                    "keep_alive": OLLAMA_KEEP_ALIVE  # Keep the weights loaded between requests
+                }
+
+                client = get_client(host)
+
+                async with model_slot(model, host):
+                    response = await client.post(
+                        "/api/chat",
+                        json=payload,
+                        timeout=timeout
+                    )
+                response.raise_for_status()
+
+                stats = response.json()
+                content = stats['message']['content']
+
+    except asyncio.CancelledError:
+        # Lost a hedge race or the deadline passed, not a host failure
+        metrics.record_request(model.model_name, host, time.monotonic() - started, "cancelled")
+        raise
+    except Exception as e:
+        # A failing or slow model leaves the other models of its host routable
+        if is_host_failure(e):
+            breaker.record_failure()
+        elif isinstance(e, httpx.HTTPStatusError):
+            # The host answered
+            breaker.record_success()
+        metrics.record_request(model.model_name, host, time.monotonic() - started, "failure")
+        raise
+
+    elapsed = time.monotonic() - started
+
+    breaker.record_success()
+    _latencies.record(model.model_name, elapsed)
+    metrics.record_request(model.model_name, host, elapsed, "success", stats)
+
+    logger.debug("Ollama request done", extra={"model": model.model_name, "host": host, "seconds": round(elapsed, 3)})
+    if logger.isEnabledFor(logging.DEBUG) and logs.sampled():
+        logger.debug("Ollama answer", extra={"model": model.model_name, **logs.payload(content)})
+
+    return {
+        'content': content,
+        'reasoning_details': None,
+        'usage': metrics.ollama_usage(stats)
+    }
+
+
+async def hedged_chat(
+    model: CouncilModel,
+    messages: List[Dict[str, str]],
+    timeout: float,
+    tried: Set[str]
+) -> Dict[str, Any]:
+    """
+    Query the best host, and a replica too if the first has not answered by the usual latency.
+
+    The hedge is sent after the HEDGE_PERCENTILE latency of the model, or
+    HEDGE_DELAY until enough latencies are known. The first answer wins and
+    the other request is cancelled.
+
+    Args:
+        model: CouncilModel instance to query
+        messages: List of message dictionaries with 'role' and 'content'
+        timeout: Request timeout in seconds
+        tried: Hosts already tried by the request, the queried hosts are added
+
+    Returns:
+        Dictionary with 'content' and 'reasoning_details'
+
+    Raises:
+        Exception: The error of the last request, if every request failed
+    """
+    tasks = [asyncio.create_task(chat_attempt(model, messages, timeout, tried=tried))]
+
+    try:
+        if HEDGE_ENABLED and len(available_hosts(model)) > 1:
+            delay = _latencies.percentile(model.model_name, HEDGE_PERCENTILE) or HEDGE_DELAY
+
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and any(host not in tried for host in available_hosts(model)):
+                tasks.append(asyncio.create_task(chat_attempt(model, messages, timeout, tried=tried)))
+
+        pending = set(tasks)
+        error = None
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+
+        raise error
+
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 async def query_model(
     model: CouncilModel,
     messages: List[Dict[str, str]],
-    timeout: float = 180.0
+    timeout: Optional[float] = None,
+    on_delta: Optional[DeltaCallback] = None,
+    deadline: Optional[float] = None
 ) -> Optional[Dict[str, Any]]:
     """
     Send a request to a local or remote Ollama instance.
+
+    The request goes to the best host of the model pool. Failed requests
+    are retried with a jittered exponential backoff on the other hosts
+    whose circuit is not open, and hedged on a replica host when the model
+    has one. When on_delta is given the completion is streamed and every
+    token delta is forwarded to the callback as it arrives ; streamed
+    requests are not hedged, and only retried before their first token.
     
     Args:
         model: CouncilModel instance with connection details
         messages: List of message dictionaries with 'role' and 'content'
-        timeout: Request timeout in seconds (default: 180s for local LLMs)
+        timeout: Timeout of each attempt in seconds, the model timeout by default
+        on_delta: Optional callback receiving (model_name, delta) while streaming
+        deadline: Total time in seconds for all attempts, None for no limit
     
     Returns:
         Dictionary with 'content' and 'reasoning_details' (None for Ollama)
         Returns None if the request fails
     """
-    headers = {
-        "Content-Type": "application/json"
-    }
+    timeout = timeout or model.timeout
 
-    payload = {
-        "model": model.model_name,
-        "messages": messages,
-        "stream": False  # Disable streaming to get complete response
-    }
+    streamed = False
+    tried = set()
+
+    def forward(model_name: str, delta: str) -> None:
+        nonlocal streamed
+        streamed = True
+        on_delta(model_name, delta)
 
     try:
-        async with httpx.AsyncClient() as client:
-            url = f"http://{model.ip}:{model.port}/api/chat"
-            
-            response = await client.post(
-                url,
-                json=payload,
-                headers=headers,
-                timeout=timeout
-            )
-            response.raise_for_status()
+        async with asyncio.timeout(deadline):
+            for attempt in range(OLLAMA_RETRIES + 1):
+                try:
+                    if on_delta is not None:
+                        return await chat_attempt(model, messages, timeout, forward, tried)
+                    return await hedged_chat(model, messages, timeout, tried)
+
+                except Exception as e:
+                    if attempt == OLLAMA_RETRIES or streamed or not is_retryable(e):
+                        raise
 
-            data = response.json()
+                    logger.warning("Retrying ollama request", extra={"model": model.model_name, "attempt": attempt + 1, "error": str(e)})
+                    await asyncio.sleep(backoff_delay(attempt, OLLAMA_RETRY_BACKOFF, OLLAMA_RETRY_BACKOFF_MAX))
 
-            return {
-                'content': data['message']['content'],
-                'reasoning_details': None
-            }
-        
+    except TimeoutError:
+        logger.error("Deadline exceeded when querying model", extra={"model": model.model_name, "hosts": sorted(tried), "deadline": deadline})
+        return None
     except httpx.TimeoutException as e:
-        print(f"Timeout error when querying {model.model_name} at {model.host} : {e}")
+        logger.error("Timeout when querying model", extra={"model": model.model_name, "hosts": sorted(tried), "error": str(e)})
         return None
     except httpx.HTTPStatusError as e:
-        print(f"HTTP error {e.response.status_code} when querying {model.model_name}: {e}")
+        logger.error("HTTP error when querying model", extra={"model": model.model_name, "status": e.response.status_code, "error": str(e)})
         return None
     except Exception as e:
-        print(f"Error querying {model.model_name} at {model.host}: {e}")
+        logger.error("Error querying model", extra={"model": model.model_name, "hosts": sorted(tried) or [model.host], "error": str(e)})
         return None
 
 
 async def query_models_parallel(
     models: List[CouncilModel],
     messages: List[Dict[str, str]],
-    timeout: float = 180.0
+    timeout: Optional[float] = None,
+    on_delta: Optional[DeltaCallback] = None,
+    deadline: Optional[float] = None
 ) -> Dict[str, Optional[Dict[str, Any]]]:
     """
     Query multiple Ollama models in parallel across distributed instances.
@@ -75,13 +461,15 @@ async def query_models_parallel(
     Args:
         models: List of CouncilModel instances
         messages: List of message dictionaries to send to each model
-        timeout: Request timeout in seconds
+        timeout: Timeout of each attempt in seconds, the model timeouts by default
+        on_delta: Optional callback receiving (model_name, delta) while streaming
+        deadline: Total time in seconds for each model, None for no limit
     
     Returns:
         Dictionary mapping model names to their responses
     """
     # Create tasks for all models
-    tasks = [query_model(model, messages, timeout) for model in models]
+    tasks = [query_model(model, messages, timeout, on_delta, deadline) for model in models]
 
     # Wait for all to complete
     responses = await asyncio.gather(*tasks)
@@ -90,26 +478,149 @@ async def query_models_parallel(
     return {model.model_name: response for model, response in zip(models, responses)}
 
 
-async def check_model_health(model: CouncilModel) -> bool:
+async def pull_model(
+    model: CouncilModel,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    timeout: float = 600.0,
+    host: Optional[str] = None
+) -> bool:
+    """
+    Pull the base model of a CouncilModel on its Ollama instance, streaming the progress.
+
+    Args:
+        model: CouncilModel instance to pull
+        on_progress: Optional callback receiving each progress chunk ('status', 'completed', 'total')
+        timeout: Maximum wait in seconds between two progress chunks
+        host: Host to pull on, the main host of the model by default
+
+    Returns:
+        True if the model is available, False otherwise
+    """
+    payload = {
+        "model": model.base_model,
+        "stream": True
+    }
+
+    host = host or model.host
+
+    try:
+        client = get_client(host)
+
+        async with client.stream("POST", "/api/pull", json=payload, timeout=timeout) as response:
+            response.raise_for_status()
+
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+
+                chunk = json.loads(line)
+
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+
+                if on_progress is not None:
+                    on_progress(chunk)
+
+        logger.info("Pulled model", extra={"model": model.base_model, "host": host})
+        return True
+
+    except Exception as e:
+        logger.error("Failed to pull model", extra={"model": model.base_model, "host": host, "error": str(e)})
+        return False
+
+
+async def create_model(model: CouncilModel, timeout: float = 600.0, host: Optional[str] = None) -> bool:
+    """
+    Create a custom model from the base model and system prompt of a CouncilModel.
+
+    Args:
+        model: CouncilModel instance with a prompt and a custom name
+        timeout: Request timeout in seconds
+        host: Host to create the model on, the main host of the model by default
+
+    Returns:
+        True if the model was created, False otherwise
+    """
+    payload = {
+        "model": model.model_name,
+        "from": model.base_model,
+        "system": model.prompt,
+        "stream": False
+    }
+
+    host = host or model.host
+
+    try:
+        client = get_client(host)
+
+        response = await client.post("/api/create", json=payload, timeout=timeout)
+        response.raise_for_status()
+
+        logger.info("Created model", extra={"model": model.model_name, "base_model": model.base_model, "host": host})
+        return True
+
+    except Exception as e:
+        logger.error("Failed to create model", extra={"model": model.model_name, "host": host, "error": str(e)})
+        return False
+
+
+async def preload_model(model: CouncilModel, timeout: float = 300.0, host: Optional[str] = None) -> bool:
+    """
+    Load a model in memory on its Ollama instance, without generating anything.
+
+    Args:
+        model: CouncilModel instance to load
+        timeout: Request timeout in seconds, loading weights can be slow
+        host: Host to load the model on, the main host of the model by default
+
+    Returns:
+        True if the model is loaded, False otherwise
+    """
+    payload = {
+        "model": model.model_name,
+        "messages": [],  # An empty chat only loads the model
+        "keep_alive": OLLAMA_KEEP_ALIVE
+    }
+
+    host = host or model.host
+
+    try:
+        client = get_client(host)
+
+        async with model_slot(model, host):
+            response = await client.post("/api/chat", json=payload, timeout=timeout)
+        response.raise_for_status()
+
+        return True
+
+    except Exception as e:
+        logger.warning("Preload failed", extra={"model": model.model_name, "host": host, "error": str(e)})
+        return False
+
+
+async def check_model_health(model: CouncilModel, host: Optional[str] = None) -> bool:
     """
     Check if an Ollama instance is reachable and the model is available.
     
     Args:
         model: CouncilModel instance to check
+        host: Host to check, the main host of the model by default
     
     Returns:
         True if the model is available, False otherwise
     """
+    host = host or model.host
+
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            url = f"http://{model.host}/api/tags"
-            response = await client.get(url)
-            response.raise_for_status()
-            
-            data = response.json()
-            # Check if the model exists in the list of available models
-            available_models = [m['name'] for m in data.get('models', [])]
-            return model.model_name in available_models
+        client = get_client(host)
+
+        response = await client.get("/api/tags", timeout=5.0)
+        response.raise_for_status()
+
+        data = response.json()
+        # Check if the model exists in the list of available models
+        available_models = [m['name'] for m in data.get('models', [])]
+        return model.model_name in available_models or f"{model.model_name}:latest" in available_models
     except Exception as e:
-        print(f"Health check failed for {model.model_name} at {model.host}: {e}")
+        logger.warning("Health check failed", extra={"model": model.model_name, "host": host, "error": str(e)})
         return False
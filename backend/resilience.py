@@ -0,0 +1,122 @@
+"""Resilience helpers for Ollama requests : circuit breakers, latency tracking and retry backoff."""
+
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import httpx
+
+
+class HostUnavailableError(Exception):
+    """Raised when every host able to serve a model is known to be down."""
+
+
+class CircuitBreaker():
+    """
+    Skip a host after `threshold` consecutive failures, for `cooldown` seconds.
+
+    Once the cooldown elapsed the host is tried again (half-open) : a success
+    closes the circuit, a failure opens it for another cooldown.
+    """
+
+    def __init__(self, threshold: int = 3, cooldown: float = 30.0):
+
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+        self.failures : int = 0
+        self.opened_at : Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        """Get the circuit state : 'closed', 'open' or 'half-open'."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        """Check whether requests may be sent to the host."""
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful request."""
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        """Count a failed request, opening the circuit past the threshold."""
+        self.failures += 1
+
+        if self.failures >= self.threshold or self.state == "half-open":
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker():
+    """Rolling window of request latencies, by key."""
+
+    def __init__(self, size: int = 100):
+
+        self.size = size
+        self.samples : Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        """Add a latency sample."""
+        self.samples.setdefault(key, deque(maxlen=self.size)).append(seconds)
+
+    def percentile(self, key: str, q: float, min_samples: int = 10) -> Optional[float]:
+        """
+        Get a latency percentile.
+
+        Args:
+            key: Key of the samples
+            q: Percentile, between 0 and 100
+            min_samples: Samples needed for the value to be meaningful
+
+        Returns:
+            Latency in seconds, None if there are not enough samples
+        """
+        samples = sorted(self.samples.get(key, ()))
+
+        if len(samples) < min_samples:
+            return None
+
+        index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Get the wait before a retry, exponential with full jitter.
+
+    Args:
+        attempt: Number of the failed attempt, starting at 0
+        base: Base delay in seconds
+        cap: Maximum delay in seconds
+
+    Returns:
+        Delay in seconds
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Check whether a failed request may succeed if sent again."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def is_host_failure(error: Exception) -> bool:
+    """
+    Check whether a failed request tells the host is down, rather than one of its models.
+
+    Connection errors count against the host. Error statuses (model not
+    found, model crash) and read timeouts of a slow generation only concern
+    the model queried.
+    """
+    if isinstance(error, (httpx.ReadTimeout, httpx.WriteTimeout, httpx.PoolTimeout)):
+        return False
+    return isinstance(error, httpx.TransportError)
@@ -0,0 +1,362 @@
+"""Registry of the council runs (streams and background jobs), decoupled from the HTTP connections following them."""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+# A buffered event and its sequence number, 1 for the first event of a run
+SequencedEvent = Tuple[int, Dict[str, Any]]
+
+# Stage results carried by the events, by event type
+RESULT_EVENTS = {"stage1_complete": "stage1", "stage2_complete": "stage2", "stage3_complete": "stage3"}
+
+
+class CouncilRun():
+    """
+    Events of one council run, kept in a bounded buffer.
+
+    The run goes on when its clients disconnect ; a client reconnecting with
+    the sequence number of the last event it got replays the events it missed,
+    then follows the live run. The state of the run and the results of the
+    stages done so far are kept aside, for the clients polling it.
+    """
+
+    def __init__(self, conversation_id: str, user_query: str, buffer_size: int = 5000):
+
+        self.id : str = uuid.uuid4().hex
+        self.conversation_id = conversation_id
+        self.user_query = user_query
+
+        self.events : Deque[SequencedEvent] = deque(maxlen=buffer_size)
+        self.last_seq : int = 0
+
+        self.done : bool = False
+        self.created_at : str = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.finished_at : Optional[float] = None
+        self.task : Optional[asyncio.Task] = None
+
+        # 'queued', 'running', 'complete', 'failed' or 'cancelled', with the results so far
+        self.status : str = "queued"
+        self.position : int = 0
+        self.results : Dict[str, Any] = {"stage1": None, "stage2": None, "stage3": None, "metadata": {}, "title": None}
+        self.error : Optional[str] = None
+
+        # Set and replaced on every change, followers wait on the one they saw
+        self.changed = asyncio.Event()
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        """
+        Add an event to the run.
+
+        Args:
+            event: Event to send to the followers
+
+        Returns:
+            Sequence number of the event
+        """
+        self.last_seq += 1
+        self.events.append((self.last_seq, event))
+        self.track(event)
+        self.notify()
+        return self.last_seq
+
+    def track(self, event: Dict[str, Any]) -> None:
+        """Update the state and results of the run from one of its events."""
+        kind = event.get("type")
+
+        if kind == "queued":
+            self.position = event["position"]
+        elif kind == "complete":
+            self.status = "complete"
+            self.results["metadata"].update(event.get("metadata") or {})
+        elif kind == "error":
+            self.status = "failed"
+            self.error = event.get("message")
+        elif kind == "cancelled":
+            self.status = "cancelled"
+        else:
+            self.status, self.position = "running", 0
+
+        if kind in RESULT_EVENTS:
+            self.results[RESULT_EVENTS[kind]] = event.get("data")
+            if kind != "stage1_complete":
+                self.results["metadata"].update(event.get("metadata") or {})
+        elif kind == "stage1_late":
+            self.results["stage1"] = (self.results["stage1"] or []) + event.get("data", [])
+        elif kind == "title_complete":
+            self.results["title"] = event["data"]["title"]
+
+    def finish(self) -> None:
+        """Mark the run as done, followers stop once they got every event."""
+        self.done = True
+        self.finished_at = time.monotonic()
+        self.notify()
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def follow(self, after: int = 0) -> AsyncIterator[SequencedEvent]:
+        """
+        Replay the buffered events after a sequence number, then the live ones until the run is done.
+
+        Args:
+            after: Sequence number of the last event already received, 0 for all
+
+        Yields:
+            Sequenced events, preceded by a 'replay_gap' event if some were evicted from the buffer
+        """
+        while True:
+            changed = self.changed
+
+            # Events evicted from the buffer cannot be replayed, the client is told how many it missed
+            oldest = self.events[0][0] if self.events else self.last_seq + 1
+            if after < oldest - 1:
+                yield oldest - 1, {'type': 'replay_gap', 'missed': oldest - 1 - after}
+                after = oldest - 1
+
+            for seq, event in list(self.events):
+                if seq > after:
+                    yield seq, event
+                    after = seq
+
+            if self.done and after >= self.last_seq:
+                return
+
+            await changed.wait()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the state of the run and the results of the stages done so far."""
+        return {
+            "job_id": self.id,
+            "conversation_id": self.conversation_id,
+            "status": self.status,
+            "position": self.position,
+            "created_at": self.created_at,
+            "done": self.done,
+            "events": self.last_seq,
+            "error": self.error,
+            **self.results
+        }
+
+
+class RunRegistry():
+    """
+    Council runs in progress, and those finished less than `retention` seconds ago.
+
+    Each run is produced by a task of its own, that the clients only follow.
+
+    With several API workers, the snapshots of the runs are also written to
+    a shared directory, so any worker answers the polls of a job, and
+    cancels it by leaving a marker its worker picks up. The events
+    themselves are only followed on the worker running it.
+    """
+
+    def __init__(self, buffer_size: int = 5000, retention: float = 300.0, shared_dir: Optional[str] = None):
+
+        self.buffer_size = buffer_size
+        self.retention = retention
+        self.shared_dir = shared_dir
+
+        self.runs : Dict[str, CouncilRun] = {}
+
+    def start(self, conversation_id: str, user_query: str, events: AsyncIterator[Dict[str, Any]]) -> CouncilRun:
+        """
+        Start a run in the background.
+
+        Args:
+            conversation_id: Conversation the run answers in
+            user_query: The user's question
+            events: Events of the run, consumed by the background task
+
+        Returns:
+            The started run
+        """
+        self.prune()
+
+        run = CouncilRun(conversation_id, user_query, self.buffer_size)
+        run.task = asyncio.create_task(self.produce(run, events))
+        self.runs[run.id] = run
+
+        return run
+
+    async def produce(self, run: CouncilRun, events: AsyncIterator[Dict[str, Any]]) -> None:
+        """Publish the events of a run as they are produced."""
+        try:
+            async for event in events:
+                run.publish(event)
+
+                # Token deltas do not change the snapshot
+                if not event["type"].endswith("_delta"):
+                    await self.share(run)
+        except asyncio.CancelledError:
+            run.publish({'type': 'cancelled'})
+            raise
+        finally:
+            run.finish()
+            await self.share(run)
+
+    def get(self, run_id: str) -> Optional[CouncilRun]:
+        """Get a run in progress or recently finished."""
+        self.prune()
+        return self.runs.get(run_id)
+
+    def active(self, conversation_id: str, user_query: str) -> Optional[CouncilRun]:
+        """Get the run in progress answering the same question in a conversation, if any."""
+        return next((
+            run for run in self.runs.values()
+            if not run.done and run.conversation_id == conversation_id and run.user_query == user_query
+        ), None)
+
+    def snapshot(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the state and results of a run, from this worker or the shared directory.
+
+        Args:
+            run_id: Id of the run
+
+        Returns:
+            Snapshot of the run, None if unknown or expired
+        """
+        run = self.get(run_id)
+        if run is not None:
+            return run.snapshot()
+
+        return self.read_shared(run_id)
+
+    async def cancel(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancel a run, its requests to the models are stopped.
+
+        A run of another worker is cancelled by that worker within a
+        second, its status is 'cancelling' meanwhile.
+
+        Args:
+            run_id: Id of the run
+
+        Returns:
+            Snapshot of the run, None if unknown or expired
+        """
+        run = self.get(run_id)
+
+        if run is not None:
+            if run.task is not None and not run.task.done():
+                run.task.cancel()
+                await asyncio.gather(run.task, return_exceptions=True)
+            return run.snapshot()
+
+        snapshot = self.read_shared(run_id)
+        if snapshot is not None and not snapshot["done"]:
+            Path(self.get_shared_path(run_id, ".cancel")).touch()
+            snapshot["status"] = "cancelling"
+
+        return snapshot
+
+    async def watch_cancellations(self, interval: float = 1.0) -> None:
+        """Cancel the runs of this worker that another worker was asked to cancel, until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+
+            for run in list(self.runs.values()):
+                marker = self.get_shared_path(run.id, ".cancel")
+                if not run.done and os.path.exists(marker):
+                    os.remove(marker)
+                    await self.cancel(run.id)
+
+    def get_shared_path(self, run_id: str, suffix: str = ".json") -> str:
+        """Get the path of the shared snapshot of a run, or of another file about it."""
+        return os.path.join(self.shared_dir, f"{run_id}{suffix}")
+
+    async def share(self, run: CouncilRun) -> None:
+        """
+        Write the snapshot of a run to the shared directory, if any, in a thread.
+
+        The run only changes when its producer publishes, which waits for
+        the write, so the snapshot is not modified while being serialized.
+        """
+        if self.shared_dir is not None:
+            await asyncio.to_thread(self.write_shared, run.id, {**run.snapshot(), "worker": os.getpid()})
+
+    def write_shared(self, run_id: str, snapshot: Dict[str, Any]) -> None:
+        """Write a run snapshot to the shared directory, replacing it atomically."""
+        Path(self.shared_dir).mkdir(parents=True, exist_ok=True)
+
+        path = self.get_shared_path(run_id)
+        tmp_path = path + ".tmp"
+
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+
+        os.replace(tmp_path, path)
+
+    def read_shared(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Read the snapshot of a run shared by another worker, None if missing or expired."""
+        if self.shared_dir is None or not run_id.isalnum():
+            return None
+
+        path = self.get_shared_path(run_id)
+        try:
+            with open(path, 'r') as f:
+                snapshot = json.load(f)
+            updated = os.path.getmtime(path)
+        except (OSError, ValueError):
+            return None
+
+        if snapshot["done"] and time.time() - updated > self.retention:
+            return None
+
+        return snapshot
+
+    def prune(self) -> None:
+        """Forget the runs finished more than `retention` seconds ago."""
+        now = time.monotonic()
+
+        for run_id, run in list(self.runs.items()):
+            if run.done and now - run.finished_at > self.retention:
+                del self.runs[run_id]
+
+                if self.shared_dir is not None:
+                    for suffix in (".json", ".cancel"):
+                        try:
+                            os.remove(self.get_shared_path(run_id, suffix))
+                        except OSError:
+                            pass
+
+    async def shutdown(self) -> None:
+        """Cancel the runs in progress."""
+        tasks = [run.task for run in self.runs.values() if run.task and not run.task.done()]
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of runs in progress and kept for replay."""
+        self.prune()
+        return {
+            "running": sum(not run.done for run in self.runs.values()),
+            "finished": sum(run.done for run in self.runs.values())
+        }
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[str, int]]:
+    """
+    Read a 'run_id:seq' SSE event id, as sent back in the Last-Event-ID header.
+
+    Returns:
+        Tuple of (run id, sequence number), None if missing or malformed
+    """
+    if not event_id:
+        return None
+
+    run_id, _, seq = event_id.partition(":")
+    if not run_id or not seq.isdigit():
+        return None
+
+    return run_id, int(seq)
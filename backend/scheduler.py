@@ -0,0 +1,130 @@
+"""Admission control for council runs : a bounded number of runs, behind a FIFO queue."""
+
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when a run is submitted while the waiting queue is full."""
+
+
+class Ticket():
+    """Place of one council run in the scheduler, granted or waiting."""
+
+    def __init__(self):
+
+        self.granted : bool = False
+        self.position : int = 0
+        self.changed = asyncio.Event()
+
+    def update(self, position: int) -> None:
+        """Move the ticket in the queue, position 0 meaning granted."""
+        self.position = position
+        self.granted = position == 0
+        self.changed.set()
+
+    async def positions(self) -> AsyncIterator[int]:
+        """
+        Wait until the ticket is granted.
+
+        Yields:
+            The 1-based queue position, each time it changes
+        """
+        while not self.granted:
+            # Cleared before yielding, the changes made while the consumer is busy are not lost
+            self.changed.clear()
+            yield self.position
+
+            if not self.granted:
+                await self.changed.wait()
+
+    async def wait(self) -> None:
+        """Wait until the ticket is granted."""
+        async for _ in self.positions():
+            pass
+
+
+class CouncilScheduler():
+    """
+    Let at most `max_running` council runs go through at once.
+
+    Extra runs wait in a FIFO queue of at most `max_queued` tickets, further
+    submissions are rejected with QueueFullError.
+    """
+
+    def __init__(self, max_running: int = 2, max_queued: int = 16):
+
+        self.max_running = max_running
+        self.max_queued = max_queued
+
+        self.running : int = 0
+        self.queue : Deque[Ticket] = deque()
+
+        self.rejected : int = 0
+
+    def is_full(self) -> bool:
+        """Check whether a new submission would be rejected."""
+        return self.running >= self.max_running and len(self.queue) >= self.max_queued
+
+    def reject(self) -> QueueFullError:
+        """Count a submission turned away because the queue is full, returning the error to raise."""
+        self.rejected += 1
+        return QueueFullError("Too many council runs queued, retry later.")
+
+    def submit(self) -> Ticket:
+        """
+        Request a slot for a council run.
+
+        Returns:
+            Ticket, already granted if a slot is free
+
+        Raises:
+            QueueFullError: If every slot is busy and the queue is full
+        """
+        if self.is_full():
+            raise self.reject()
+
+        ticket = Ticket()
+        self.queue.append(ticket)
+        self.promote()
+
+        return ticket
+
+    def release(self, ticket: Optional[Ticket]) -> None:
+        """
+        Give back the slot of a finished run, or leave the queue.
+
+        Args:
+            ticket: Ticket returned by submit, None is ignored
+        """
+        if ticket is None:
+            return
+
+        if ticket.granted:
+            self.running -= 1
+            ticket.granted = False
+        elif ticket in self.queue:
+            self.queue.remove(ticket)
+
+        self.promote()
+
+    def promote(self) -> None:
+        """Grant free slots to the oldest tickets and refresh the queue positions."""
+        while self.running < self.max_running and self.queue:
+            self.queue.popleft().update(0)
+            self.running += 1
+
+        for position, ticket in enumerate(self.queue, start=1):
+            if ticket.position != position:
+                ticket.update(position)
+
+    def stats(self) -> Dict[str, int]:
+        """Get the scheduler counters."""
+        return {
+            "running": self.running,
+            "queued": len(self.queue),
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+            "rejected": self.rejected
+        }
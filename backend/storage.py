@@ -1,23 +1,285 @@
-"""JSON-based storage for conversations."""
+"""
+Append-only storage for conversations, with a SQLite index of their metadata.
+
+Each conversation is a JSONL log : a header line with the conversation
+metadata, followed by one record per message, message update, title
+update or summary update. Writes only append a record, the log is compacted back to header +
+messages once it holds enough superseded records.
+"""
 
 import json
 import os
+import sqlite3
+import threading
+import weakref
+from contextlib import closing
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
-from config import DATA_DIR
+from config import DATA_DIR, STORAGE_COMPACT_THRESHOLD
+
+# Bump when the index schema changes, the index is then rebuilt from the files
+INDEX_VERSION = 1
+
+# Advisory locks between the API worker processes, unavailable on Windows where a single worker is run
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# One lock per conversation, alive as long as a thread is using it
+_locks: "weakref.WeakValueDictionary[str, ConversationLock]" = weakref.WeakValueDictionary()
+_locks_guard = threading.Lock()
+
+
+class ConversationLock():
+    """
+    Reentrant lock of a conversation, held across the threads and the worker processes.
+
+    The threads of a process share a reentrant lock, the thread holding it
+    also holds an exclusive lock on the lock file of the conversation, so
+    the writes of another worker wait until it is released. The lock file
+    is apart from the log, replaced on compaction.
+    """
+
+    def __init__(self, conversation_id: str):
+
+        self.path = get_lock_path(conversation_id)
+        self.thread_lock = threading.RLock()
+
+        # Nesting depth of the owning thread, the file lock is taken by the outermost acquisition
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self) -> "ConversationLock":
+        self.thread_lock.acquire()
+
+        if self.depth == 0:
+            try:
+                ensure_data_dir()
+                self.file = open(self.path, 'a')
+                if fcntl is not None:
+                    fcntl.flock(self.file, fcntl.LOCK_EX)
+            except BaseException:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                self.thread_lock.release()
+                raise
+
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.depth -= 1
+
+        if self.depth == 0:
+            # Closing the file releases the lock
+            self.file.close()
+            self.file = None
+
+        self.thread_lock.release()
+
+
+def conversation_lock(conversation_id: str) -> ConversationLock:
+    """
+    Get the lock serializing writes to a conversation.
+
+    Args:
+        conversation_id: Conversation identifier
+
+    Returns:
+        Reentrant lock shared by every thread and worker process working on the conversation
+    """
+    with _locks_guard:
+        lock = _locks.get(conversation_id)
+        if lock is None:
+            lock = ConversationLock(conversation_id)
+            _locks[conversation_id] = lock
+        return lock
 
 
 def ensure_data_dir():
-    """Ensure the data directory exists."""
-    Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
+    """Ensure the data directory and its lock directory exist."""
+    Path(DATA_DIR, "locks").mkdir(parents=True, exist_ok=True)
 
 
 def get_conversation_path(conversation_id: str) -> str:
-    """Get the file path for a conversation."""
+    """Get the file path for a conversation log."""
+    return os.path.join(DATA_DIR, f"{conversation_id}.jsonl")
+
+
+def get_legacy_path(conversation_id: str) -> str:
+    """Get the file path for a conversation saved as a single JSON document."""
     return os.path.join(DATA_DIR, f"{conversation_id}.json")
 
 
+def get_lock_path(conversation_id: str) -> str:
+    """Get the file path of the lock of a conversation, shared by the worker processes."""
+    return os.path.join(DATA_DIR, "locks", f"{conversation_id}.lock")
+
+
+def get_index_path() -> str:
+    """Get the file path of the conversation metadata index."""
+    return os.path.join(DATA_DIR, "index.sqlite3")
+
+
+def connect_index() -> sqlite3.Connection:
+    """
+    Open the metadata index, creating and filling it on first use.
+
+    Returns:
+        Connection to the SQLite index
+    """
+    ensure_data_dir()
+
+    conn = sqlite3.connect(get_index_path(), timeout=30)
+    conn.row_factory = sqlite3.Row
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != INDEX_VERSION:
+        rebuild_index(conn)
+
+    return conn
+
+
+def rebuild_index(conn: sqlite3.Connection):
+    """
+    Recreate the metadata index from the conversation files.
+
+    Args:
+        conn: Connection to the SQLite index
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+
+    # Concurrent connections may find the index missing at once, the first one builds it
+    conn.execute("BEGIN IMMEDIATE")
+
+    with conn:
+        if conn.execute("PRAGMA user_version").fetchone()[0] == INDEX_VERSION:
+            return
+
+        conn.execute("DROP TABLE IF EXISTS conversations")
+        conn.execute("""
+            CREATE TABLE conversations (
+                id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                title TEXT NOT NULL,
+                message_count INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX conversations_created_at ON conversations (created_at)")
+
+        for filename in os.listdir(DATA_DIR):
+            conversation = None
+            path = os.path.join(DATA_DIR, filename)
+
+            if filename.endswith('.jsonl'):
+                conversation, _ = read_log(path)
+            elif filename.endswith('.json'):
+                with open(path, 'r') as f:
+                    conversation = json.load(f)
+
+            if conversation is not None:
+                index_conversation(conn, conversation)
+
+        conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+
+def index_conversation(conn: sqlite3.Connection, conversation: Dict[str, Any]):
+    """
+    Insert or update the metadata of a conversation in the index.
+
+    Args:
+        conn: Connection to the SQLite index
+        conversation: Conversation dict to index
+    """
+    conn.execute(
+        "INSERT OR REPLACE INTO conversations (id, created_at, title, message_count) VALUES (?, ?, ?, ?)",
+        (
+            conversation["id"],
+            conversation["created_at"],
+            conversation.get("title", "New Conversation"),
+            len(conversation["messages"])
+        )
+    )
+
+
+def read_log(path: str) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    Replay a conversation log.
+
+    Args:
+        path: Path of the JSONL log
+
+    Returns:
+        Tuple of (conversation dict or None if empty, number of superseded records)
+    """
+    conversation = None
+    superseded = 0
+
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn line from an interrupted append
+                continue
+
+            if record["type"] == "header":
+                conversation = {
+                    "id": record["id"],
+                    "created_at": record["created_at"],
+                    "title": record["title"],
+                    "messages": []
+                }
+                if record.get("summary"):
+                    conversation["summary"] = record["summary"]
+            elif record["type"] == "message":
+                conversation["messages"].append(record["message"])
+            elif record["type"] == "message_update":
+                conversation["messages"][record["index"]] = record["message"]
+                superseded += 1
+            elif record["type"] == "title":
+                conversation["title"] = record["title"]
+                superseded += 1
+            elif record["type"] == "summary":
+                conversation["summary"] = record["summary"]
+                superseded += 1
+
+    return conversation, superseded
+
+
+def append_record(conversation_id: str, record: Dict[str, Any]):
+    """
+    Append one record to a conversation log.
+
+    Args:
+        conversation_id: Conversation identifier
+        record: Record to append
+
+    Raises:
+        ValueError: If the conversation does not exist
+    """
+    path = get_conversation_path(conversation_id)
+
+    if not os.path.exists(path) and get_conversation(conversation_id) is None:
+        raise ValueError(f"Conversation {conversation_id} not found")
+
+    with open(path, 'a+b') as f:
+        # A torn line left by an interrupted append is ended first, this record is not merged into it
+        f.seek(0, os.SEEK_END)
+        torn = False
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b"\n"
+
+        f.write((("\n" if torn else "") + json.dumps(record) + "\n").encode("utf-8"))
+
+
 def create_conversation(conversation_id: str) -> Dict[str, Any]:
     """
     Create a new conversation.
@@ -37,10 +299,7 @@ def create_conversation(conversation_id: str) -> Dict[str, Any]:
         "messages": []
     }
 
-    # Save to file
-    path = get_conversation_path(conversation_id)
-    with open(path, 'w') as f:
-        json.dump(conversation, f, indent=2)
+    save_conversation(conversation)
 
     return conversation
 
@@ -49,6 +308,9 @@ def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
     """
     Load a conversation from storage.
 
+    Conversations saved as a single JSON document are converted to a log
+    on first read, logs with too many superseded records are compacted.
+
     Args:
         conversation_id: Unique identifier for the conversation
 
@@ -57,16 +319,36 @@ def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
     """
     path = get_conversation_path(conversation_id)
 
-    if not os.path.exists(path):
+    # Unknown ids do not leave a lock file behind
+    if not os.path.exists(path) and not os.path.exists(get_legacy_path(conversation_id)):
         return None
 
-    with open(path, 'r') as f:
-        return json.load(f)
+    with conversation_lock(conversation_id):
+        if not os.path.exists(path):
+            legacy_path = get_legacy_path(conversation_id)
+
+            if not os.path.exists(legacy_path):
+                return None
+
+            with open(legacy_path, 'r') as f:
+                conversation = json.load(f)
+
+            save_conversation(conversation)
+            os.remove(legacy_path)
+
+            return conversation
+
+        conversation, superseded = read_log(path)
+
+        if conversation is not None and superseded >= STORAGE_COMPACT_THRESHOLD:
+            save_conversation(conversation)
+
+        return conversation
 
 
 def save_conversation(conversation: Dict[str, Any]):
     """
-    Save a conversation to storage.
+    Save a whole conversation to storage, as a compacted log.
 
     Args:
         conversation: Conversation dict to save
@@ -74,37 +356,69 @@ def save_conversation(conversation: Dict[str, Any]):
     ensure_data_dir()
 
     path = get_conversation_path(conversation['id'])
-    with open(path, 'w') as f:
-        json.dump(conversation, f, indent=2)
+    tmp_path = path + ".tmp"
+
+    with conversation_lock(conversation['id']):
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({
+                "type": "header",
+                "id": conversation["id"],
+                "created_at": conversation["created_at"],
+                "title": conversation.get("title", "New Conversation"),
+                "summary": conversation.get("summary")
+            }) + "\n")
 
+            for message in conversation["messages"]:
+                f.write(json.dumps({"type": "message", "message": message}) + "\n")
 
-def list_conversations() -> List[Dict[str, Any]]:
+        os.replace(tmp_path, path)
+
+        # Keep the metadata index in sync
+        with closing(connect_index()) as conn, conn:
+            index_conversation(conn, conversation)
+
+
+def list_conversations(limit: Optional[int] = None, before: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    List all conversations (metadata only).
+    List conversations (metadata only), newest first.
+
+    Args:
+        limit: Maximum number of conversations to return, None for all
+        before: Only return conversations created before this timestamp
 
     Returns:
         List of conversation metadata dicts
     """
-    ensure_data_dir()
+    query = "SELECT id, created_at, title, message_count FROM conversations"
+    params = []
 
-    conversations = []
-    for filename in os.listdir(DATA_DIR):
-        if filename.endswith('.json'):
-            path = os.path.join(DATA_DIR, filename)
-            with open(path, 'r') as f:
-                data = json.load(f)
-                # Return metadata only
-                conversations.append({
-                    "id": data["id"],
-                    "created_at": data["created_at"],
-                    "title": data.get("title", "New Conversation"),
-                    "message_count": len(data["messages"])
-                })
+    if before is not None:
+        query += " WHERE created_at < ?"
+        params.append(before)
+
+    query += " ORDER BY created_at DESC LIMIT ?"
+    params.append(-1 if limit is None else limit)
+
+    with closing(connect_index()) as conn:
+        return [dict(row) for row in conn.execute(query, params)]
 
-    # Sort by creation time, newest first
-    conversations.sort(key=lambda x: x["created_at"], reverse=True)
 
-    return conversations
+def add_message(conversation_id: str, message: Dict[str, Any]):
+    """
+    Append a message to a conversation.
+
+    Args:
+        conversation_id: Conversation identifier
+        message: Message dict to append
+    """
+    with conversation_lock(conversation_id):
+        append_record(conversation_id, {"type": "message", "message": message})
+
+        with closing(connect_index()) as conn, conn:
+            conn.execute(
+                "UPDATE conversations SET message_count = message_count + 1 WHERE id = ?",
+                (conversation_id,)
+            )
 
 
 def add_user_message(conversation_id: str, content: str):
@@ -115,17 +429,11 @@ def add_user_message(conversation_id: str, content: str):
         conversation_id: Conversation identifier
         content: User message content
     """
-    conversation = get_conversation(conversation_id)
-    if conversation is None:
-        raise ValueError(f"Conversation {conversation_id} not found")
-
-    conversation["messages"].append({
+    add_message(conversation_id, {
         "role": "user",
         "content": content
     })
 
-    save_conversation(conversation)
-
 
 def add_assistant_message(
     conversation_id: str,
@@ -142,18 +450,42 @@ def add_assistant_message(
         stage2: List of model rankings
         stage3: Final synthesized response
     """
-    conversation = get_conversation(conversation_id)
-    if conversation is None:
-        raise ValueError(f"Conversation {conversation_id} not found")
-
-    conversation["messages"].append({
+    add_message(conversation_id, {
         "role": "assistant",
         "stage1": stage1,
         "stage2": stage2,
         "stage3": stage3
     })
 
-    save_conversation(conversation)
+
+def update_assistant_message(
+    conversation_id: str,
+    index: int,
+    stage1: List[Dict[str, Any]],
+    stage2: List[Dict[str, Any]],
+    stage3: Dict[str, Any]
+):
+    """
+    Replace the stages of an existing assistant message.
+
+    Args:
+        conversation_id: Conversation identifier
+        index: Position of the assistant message in the conversation
+        stage1: List of individual model responses
+        stage2: List of model rankings
+        stage3: Final synthesized response
+    """
+    with conversation_lock(conversation_id):
+        append_record(conversation_id, {
+            "type": "message_update",
+            "index": index,
+            "message": {
+                "role": "assistant",
+                "stage1": stage1,
+                "stage2": stage2,
+                "stage3": stage3
+            }
+        })
 
 
 def update_conversation_title(conversation_id: str, title: str):
@@ -164,12 +496,34 @@ def update_conversation_title(conversation_id: str, title: str):
         conversation_id: Conversation identifier
         title: New title for the conversation
     """
-    conversation = get_conversation(conversation_id)
-    if conversation is None:
-        raise ValueError(f"Conversation {conversation_id} not found")
+    with conversation_lock(conversation_id):
+        append_record(conversation_id, {"type": "title", "title": title})
 
-    conversation["title"] = title
-    save_conversation(conversation)
+        with closing(connect_index()) as conn, conn:
+            conn.execute("UPDATE conversations SET title = ? WHERE id = ?", (title, conversation_id))
+
+
+def update_conversation_summary(conversation_id: str, text: str, turns: int):
+    """
+    Update the rolling summary of the earlier turns of a conversation.
+
+    A summary covering fewer turns than the saved one is dropped, updates
+    of concurrent turns may finish out of order.
+
+    Args:
+        conversation_id: Conversation identifier
+        text: Summary of the turns
+        turns: Number of turns (question and answer) it covers, from the first one
+    """
+    with conversation_lock(conversation_id):
+        conversation = get_conversation(conversation_id)
+        if conversation is None:
+            raise ValueError(f"Conversation {conversation_id} not found")
+
+        if turns <= (conversation.get("summary") or {}).get("turns", 0):
+            return
+
+        append_record(conversation_id, {"type": "summary", "summary": {"text": text, "turns": turns}})
 
 
 def delete_conversation(conversation_id: str) -> bool:
@@ -182,8 +536,24 @@ def delete_conversation(conversation_id: str) -> bool:
     Returns:
         True if deleted, False if not found
     """
-    path = get_conversation_path(conversation_id)
-    if not os.path.exists(path):
+    deleted = False
+
+    # Unknown ids do not leave a lock file behind
+    if not os.path.exists(get_conversation_path(conversation_id)) and not os.path.exists(get_legacy_path(conversation_id)):
         return False
-    os.remove(path)
+
+    # The lock file is kept : removing it while held would let a waiting
+    # worker and a newcomer lock two different files at once
+    with conversation_lock(conversation_id):
+        for path in (get_conversation_path(conversation_id), get_legacy_path(conversation_id)):
+            if os.path.exists(path):
+                os.remove(path)
+                deleted = True
+
+        if not deleted:
+            return False
+
+        with closing(connect_index()) as conn, conn:
+            conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
     return True
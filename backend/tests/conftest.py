@@ -0,0 +1,6 @@
+"""Run the tests from the backend modules, imported flat as the API does."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,61 @@
+"""Tests of the council run scheduler."""
+
+import asyncio
+
+from scheduler import CouncilScheduler
+
+
+def test_grant_while_consumer_is_busy():
+    """A ticket granted while its consumer awaits between two positions is not lost."""
+    async def scenario():
+        scheduler = CouncilScheduler(max_running=1, max_queued=4)
+        first = scheduler.submit()
+        second = scheduler.submit()
+
+        positions = []
+
+        async def follow():
+            async for position in second.positions():
+                positions.append(position)
+                # Busy elsewhere (e.g. writing a snapshot) when the slot is freed
+                await asyncio.sleep(0.05)
+
+        consumer = asyncio.create_task(follow())
+        await asyncio.sleep(0.01)
+        scheduler.release(first)
+
+        await asyncio.wait_for(consumer, timeout=1)
+        scheduler.release(second)
+
+        return positions, scheduler.stats()
+
+    positions, stats = asyncio.run(scenario())
+
+    assert positions == [1]
+    assert stats["running"] == 0
+
+
+def test_positions_follow_the_queue():
+    """A waiting ticket reports its position each time it moves."""
+    async def scenario():
+        scheduler = CouncilScheduler(max_running=1, max_queued=4)
+        first = scheduler.submit()
+        second = scheduler.submit()
+        third = scheduler.submit()
+
+        positions = []
+
+        async def follow():
+            async for position in third.positions():
+                positions.append(position)
+
+        consumer = asyncio.create_task(follow())
+        await asyncio.sleep(0.01)
+        scheduler.release(first)
+        await asyncio.sleep(0.01)
+        scheduler.release(second)
+
+        await asyncio.wait_for(consumer, timeout=1)
+        return positions
+
+    assert asyncio.run(scenario()) == [2, 1]
@@ -0,0 +1,28 @@
+"""Tests of the conversation storage."""
+
+import pytest
+
+import storage
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Store the conversations in a temporary directory."""
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path))
+
+
+def test_append_after_torn_line():
+    """A message appended after an interrupted append is kept, and counted once."""
+    storage.create_conversation("c1")
+    storage.add_user_message("c1", "q1")
+
+    # Append killed halfway, no trailing newline
+    with open(storage.get_conversation_path("c1"), 'a') as f:
+        f.write('{"type": "message", "message": {"role": "us')
+
+    storage.add_user_message("c1", "q2")
+
+    conversation = storage.get_conversation("c1")
+
+    assert [message["content"] for message in conversation["messages"]] == ["q1", "q2"]
+    assert storage.list_conversations()[0]["message_count"] == 2
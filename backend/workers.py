@@ -0,0 +1,106 @@
+"""State shared by the API worker processes : each worker publishes its metrics and status to a common directory."""
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import logs
+from config import WORKERS_DIR, WORKERS_PUBLISH_INTERVAL
+
+logger = logs.get_logger("workers")
+
+# Workers publish their state once given a shared directory, a single worker only serves its own
+SHARED = bool(WORKERS_DIR)
+
+# Workers that did not publish for this long are stopped or hung, their state is left out
+STALE_AFTER = 3 * WORKERS_PUBLISH_INTERVAL
+
+
+def get_state_path(pid: int) -> str:
+    """Get the file path of the state of a worker."""
+    return os.path.join(WORKERS_DIR, f"{pid}.json")
+
+
+def publish(state: Dict[str, Any]) -> None:
+    """
+    Write the state of this worker, replacing the previous one atomically.
+
+    Args:
+        state: JSON-serializable state, e.g. its metrics and scheduler counters
+    """
+    Path(WORKERS_DIR).mkdir(parents=True, exist_ok=True)
+
+    path = get_state_path(os.getpid())
+    tmp_path = path + ".tmp"
+
+    with open(tmp_path, 'w') as f:
+        json.dump({"pid": os.getpid(), "updated": time.time(), **state}, f)
+
+    os.replace(tmp_path, path)
+
+
+def read_states() -> List[Dict[str, Any]]:
+    """
+    Read the states of the live workers, this one included once it published.
+
+    The states of workers gone for long are removed, a restarted worker may
+    reuse their pid.
+
+    Returns:
+        List of worker states, ordered by pid
+    """
+    states = []
+    now = time.time()
+
+    if not os.path.isdir(WORKERS_DIR):
+        return states
+
+    for filename in os.listdir(WORKERS_DIR):
+        if not filename.endswith('.json'):
+            continue
+
+        path = os.path.join(WORKERS_DIR, filename)
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        age = now - state.get("updated", 0)
+        if age <= STALE_AFTER:
+            states.append(state)
+        elif age > 10 * STALE_AFTER:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    return sorted(states, key=lambda state: state["pid"])
+
+
+def withdraw() -> None:
+    """Remove the state of this worker, on shutdown."""
+    try:
+        os.remove(get_state_path(os.getpid()))
+    except OSError:
+        pass
+
+
+async def run_publisher(collect: Callable[[], Dict[str, Any]], interval: float = WORKERS_PUBLISH_INTERVAL) -> None:
+    """
+    Publish the state of this worker every `interval` seconds, until cancelled.
+
+    Args:
+        collect: Get the current state, called on the event loop
+        interval: Seconds between two publications
+    """
+    while True:
+        try:
+            await asyncio.to_thread(publish, collect())
+        except OSError:
+            logger.exception("Could not publish the worker state")
+
+        await asyncio.sleep(interval)
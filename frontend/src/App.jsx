@@ -125,6 +125,10 @@ function App() {
       // Send message with streaming
       await api.sendMessageStream(currentConversationId, content, (eventType, event) => {
         switch (eventType) {
+          case 'queued':
+            console.info('Queued, position', event.position);
+            break;
+
           case 'stage1_start':
             console.log("Start Stage 1")
             setCurrentConversation((prev) => {
@@ -135,6 +139,22 @@ function App() {
             });
             break;
 
+          case 'stage1_delta':
+            setCurrentConversation((prev) => {
+              const messages = [...prev.messages];
+              const lastMsg = messages[messages.length - 1];
+              const stage1 = [...(lastMsg.stage1 || [])];
+              const index = stage1.findIndex((resp) => resp.model === event.model);
+              if (index === -1) {
+                stage1.push({ model: event.model, response: event.delta });
+              } else {
+                stage1[index] = { ...stage1[index], response: stage1[index].response + event.delta };
+              }
+              lastMsg.stage1 = stage1;
+              return { ...prev, messages };
+            });
+            break;
+
           case 'stage1_complete':
             console.info("End Stage 1")
             setCurrentConversation((prev) => {
@@ -146,6 +166,18 @@ function App() {
             });
             break;
 
+          case 'stage1_late':
+            setCurrentConversation((prev) => {
+              const messages = [...prev.messages];
+              const lastMsg = messages[messages.length - 1];
+              const stage1 = (lastMsg.stage1 || []).filter(
+                (resp) => !event.data.some((late) => late.model === resp.model)
+              );
+              lastMsg.stage1 = [...stage1, ...event.data];
+              return { ...prev, messages };
+            });
+            break;
+
           case 'stage2_start':
             console.info("Start Stage 2")
             setCurrentConversation((prev) => {
@@ -178,6 +210,16 @@ function App() {
             });
             break;
 
+          case 'stage3_delta':
+            setCurrentConversation((prev) => {
+              const messages = [...prev.messages];
+              const lastMsg = messages[messages.length - 1];
+              const previous = lastMsg.stage3?.response || '';
+              lastMsg.stage3 = { model: event.model, response: previous + event.delta };
+              return { ...prev, messages };
+            });
+            break;
+
           case 'stage3_complete':
             console.info("End Stage 3")
             setCurrentConversation((prev) => {
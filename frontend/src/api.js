@@ -82,6 +82,8 @@ export const api = {
 
   /**
    * Send a message and receive streaming updates.
+   * The run goes on server side if the connection drops, the stream is then
+   * resumed from the last event received.
    * @param {string} conversationId - The conversation ID
    * @param {string} content - The message content
    * @param {function} onEvent - Callback function for each event: (eventType, data) => void
@@ -103,27 +105,72 @@ export const api = {
       throw new Error('Failed to send message');
     }
 
-    const reader = response.body.getReader();
-    const decoder = new TextDecoder();
+    const runId = response.headers.get('X-Run-ID');
+    let lastEventId = await readEvents(response, onEvent);
 
+    // Connection dropped before the end of the run, follow it again from the last event
+    for (let attempt = 1; lastEventId !== null && runId && attempt <= 5; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, 1000 * attempt));
+
+      try {
+        const resumed = await fetch(`${API_BASE}/api/runs/${runId}/events`, {
+          headers: lastEventId ? { 'Last-Event-ID': lastEventId } : {},
+        });
+        if (!resumed.ok) break;
+        lastEventId = await readEvents(resumed, onEvent, lastEventId);
+      } catch (e) {
+        console.error('Failed to resume the council run:', e);
+      }
+    }
+
+    if (lastEventId !== null) {
+      throw new Error('Lost the council run stream');
+    }
+  },
+};
+
+/**
+ * Read the Server-Sent Events of a council run.
+ * @param {Response} response - Streaming response
+ * @param {function} onEvent - Callback function for each event: (eventType, data) => void
+ * @param {string} lastEventId - Id of the last event already received
+ * @returns {Promise<string|null>} null once the run ended, the last event id if the connection dropped
+ */
+async function readEvents(response, onEvent, lastEventId = '') {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  try {
     while (true) {
       const { done, value } = await reader.read();
       if (done) break;
 
-      const chunk = decoder.decode(value);
-      const lines = chunk.split('\n');
+      // Token deltas are small and frequent, keep partial lines for the next chunk
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
 
       for (const line of lines) {
-        if (line.startsWith('data: ')) {
+        if (line.startsWith('id: ')) {
+          lastEventId = line.slice(4);
+        } else if (line.startsWith('data: ')) {
           const data = line.slice(6);
           try {
             const event = JSON.parse(data);
             onEvent(event.type, event);
+            if (event.type === 'complete' || event.type === 'error') {
+              return null;
+            }
           } catch (e) {
             console.error('Failed to parse SSE event:', e);
           }
         }
       }
     }
-  },
-};
+  } catch (e) {
+    console.error('Council run stream interrupted:', e);
+  }
+
+  return lastEventId;
+}